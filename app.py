@@ -1,15 +1,28 @@
 """Flask API for sharks app."""
 
+import os
 import flask
 import flask_cors
 import flask_restful
 from flask_restful import reqparse
 import sharks_ice_lib as sil
+import calendars
+import changefeed
 import database
+import matchups
 
 app = flask.Flask(__name__)
 cors = flask_cors.CORS(app, resources={r'*': {'origins': '*'}})
 api = flask_restful.Api(app)
+# Database of the default league, other leagues' shards are stored next to it.
+app.config['DATABASE'] = os.environ.get(
+    'HOCKEY_LEAGUE_DB', database.DATABASE_PATH)
+app.config['LEAGUES'] = [
+    int(l) for l in os.environ.get(
+        'HOCKEY_LEAGUES', str(database.DEFAULT_LEAGUE)).split(',')]
+
+# Value of the league argument to query all leagues at once.
+ALL_LEAGUES = 'all'
 
 parser = reqparse.RequestParser()
 parser.add_argument('reload')
@@ -17,9 +30,38 @@ parser.add_argument('reload')
 def request_has_connection():
     return hasattr(flask.g, 'dbconn')
 
-def get_request_connection():
+def get_league(all_leagues=False):
+    """League of the request.
+
+    Args:
+      all_leagues: Whether the endpoint accepts league=all.
+    """
+    # The first configured league is the default one.
+    league = get('league', str(app.config['LEAGUES'][0]))
+    if league == ALL_LEAGUES:
+        if not all_leagues:
+            raise sil.Error('league=%s is not supported by %s' % (
+                ALL_LEAGUES, flask.request.path))
+        return league
+    if not league.isdigit() or int(league) not in app.config['LEAGUES']:
+        raise sil.Error('Unknown league %s' % league)
+    return int(league)
+
+def get_database_path(all_leagues=False):
+    """Database shard of the requested league."""
+    league = get_league(all_leagues)
+    if league == ALL_LEAGUES:
+        # Other configured leagues are attached to it, see attach_leagues.
+        league = app.config['LEAGUES'][0]
+    return database.shard_path(league, app.config['DATABASE'])
+
+def get_request_connection(all_leagues=False):
+    """Connection of the request, with all shards attached for league=all."""
     if not request_has_connection():
-        flask.g.dbconn = database.Database()
+        flask.g.dbconn = database.Database(get_database_path(all_leagues))
+        if get_league(all_leagues) == ALL_LEAGUES:
+            flask.g.dbconn.attach_leagues(
+                app.config['LEAGUES'], app.config['DATABASE'])
         # Do something to make this connection transactional.
         # I'm not familiar enough with SQLite to know what that is.
     return flask.g.dbconn
@@ -35,6 +77,33 @@ def close_db_connection(ex):
         conn.close()
 
 
+_change_feeds = {}
+
+def get_change_feed():
+    path = get_database_path()
+    if path not in _change_feeds:
+        _change_feeds[path] = changefeed.ChangeFeed(path)
+    return _change_feeds[path]
+
+
+_calendar_caches = {}
+
+def get_calendar_cache():
+    path = get_database_path()
+    if path not in _calendar_caches:
+        _calendar_caches[path] = calendars.CalendarCache(path)
+    return _calendar_caches[path]
+
+
+_matchup_engines = {}
+
+def get_matchup_engine():
+    path = get_database_path()
+    if path not in _matchup_engines:
+        _matchup_engines[path] = matchups.MatchupEngine(path)
+    return _matchup_engines[path]
+
+
 def get(variable="reload", default=False):
   args = flask.request.args
   return args.get(variable, default)
@@ -58,13 +127,21 @@ class Games(flask_restful.Resource):
     team_ids = get('team_ids', [])
     team_ids = [int(i) for i in team_ids.split(',') if i]
     try:
-      db = get_request_connection()
-      current_season = db.get_current_season()
-      print()
-      return flask.jsonify(db.get_team_games(team_ids=team_ids, min_season=current_season))
+      db = get_request_connection(all_leagues=True)
+      return flask.jsonify(db.get_team_games(team_ids=team_ids))
     except sil.Error as e:
       return flask.jsonify({'error': str(e)})
     
+class GameTimeline(flask_restful.Resource):
+
+  def get(self, game_id):
+    try:
+      db = get_request_connection()
+      return flask.jsonify(db.get_game_events(game_id))
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+
+
 class Teams(flask_restful.Resource):
 
   def get(self):
@@ -79,6 +156,117 @@ class Teams(flask_restful.Resource):
 
 
 
+class Standings(flask_restful.Resource):
+
+  def get(self):
+    top = get('top', None)
+    try:
+      db = get_request_connection()
+      season_id = int(get('season_id', 0)) or db.get_current_season()
+      return flask.jsonify(db.get_standings(
+          season_id=season_id, top=int(top) if top else None))
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+
+
+class SyncStatus(flask_restful.Resource):
+
+  def get(self):
+    runs = int(get('runs', 10))
+    try:
+      db = get_request_connection()
+      return flask.jsonify({
+          'current_season': db.get_current_season(),
+          'last_synced': {
+              'teams': db.get_last_synced('teams'),
+              'games': db.get_last_synced('games'),
+          },
+          'runs': db.get_sync_runs(limit=runs),
+      })
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+
+
+class TeamSearch(flask_restful.Resource):
+
+  def get(self):
+    query = get('q', '')
+    limit = int(get('limit', 10))
+    try:
+      db = get_request_connection(all_leagues=True)
+      return flask.jsonify(db.search_teams(query, limit=limit))
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+
+
+
+class Matchups(flask_restful.Resource):
+
+  def get(self):
+    team_id = int(get('team_id', 0))
+    opponent_id = int(get('opponent_id', 0))
+    season_id = int(get('season_id', 0)) or None
+    if not team_id:
+      return flask.jsonify({'error': 'team_id is required'})
+    try:
+      matrix = get_matchup_engine().matrix(season_id)
+      if matrix is None:
+        return flask.jsonify([])
+      if opponent_id:
+        record = matrix.pair(team_id, opponent_id)
+        records = [record] if record and record['games'] else []
+      else:
+        records = matrix.opponents(team_id)
+      db = get_request_connection()
+      names = db.get_team_names(
+          [team_id] + [r['opponent_id'] for r in records])
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+    for record in records:
+      record['name'] = names.get(record['team_id'])
+      record['opponent'] = names.get(record['opponent_id'])
+    return flask.jsonify(records)
+
+
+class Calendar(flask_restful.Resource):
+
+  def get(self):
+    team_ids = get('team_ids', '')
+    team_ids = {int(i) for i in team_ids.split(',') if i}
+    if not team_ids:
+      return flask.jsonify({'error': 'team_ids is required'})
+    try:
+      feed = get_calendar_cache().get(team_ids)
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+    response = flask.Response(feed.body, mimetype='text/calendar')
+    response.set_etag(feed.etag, weak=True)
+    response.last_modified = feed.last_modified
+    response.cache_control.max_age = int(calendars.REFRESH_INTERVAL)
+    return response.make_conditional(flask.request)
+
+
+class Changes(flask_restful.Resource):
+
+  def get(self):
+    team_ids = get('team_ids', '')
+    team_ids = {int(i) for i in team_ids.split(',') if i}
+    if not team_ids:
+      return flask.jsonify({'error': 'team_ids is required'})
+    last_event_id = flask.request.headers.get('Last-Event-ID')
+    if last_event_id is not None:
+      last_event_id = int(last_event_id)
+    try:
+      feed = get_change_feed()
+    except sil.Error as e:
+      return flask.jsonify({'error': str(e)})
+    return flask.Response(
+        feed.stream(team_ids, last_event_id=last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+
 @app.errorhandler(404)
 def page_not_found(e):
   # note that we set the 404 status explicitly
@@ -87,7 +275,14 @@ def page_not_found(e):
 
 api.add_resource(Divisions, '/api/divisions')
 api.add_resource(Games, '/api/games')
+api.add_resource(GameTimeline, '/api/games/<int:game_id>/timeline')
 api.add_resource(Teams, '/api/teams')
+api.add_resource(TeamSearch, '/api/teams/search')
+api.add_resource(Standings, '/api/standings')
+api.add_resource(Calendar, '/api/calendar')
+api.add_resource(Changes, '/api/changes')
+api.add_resource(Matchups, '/api/matchups')
+api.add_resource(SyncStatus, '/api/sync/status')
 
 
 
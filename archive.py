@@ -0,0 +1,45 @@
+"""Moves completed seasons out of the live database into archives.
+
+Every season but the newest ones is compacted into a read-only database next
+to the live one (see Database.archive_season), so the live tables and their
+indexes only grow with the active seasons. Queries of archived seasons attach
+their archive transparently.
+
+  python archive.py --keep 1
+"""
+
+import argparse
+import os
+
+import database
+
+
+def archive_seasons(db: database.Database, keep: int = 1) -> list[str]:
+  """Archives the completed seasons, returns the paths of their archives."""
+  paths = []
+  for season_id in db.get_completed_seasons(keep=keep):
+    path = db.archive_season(season_id)
+    print('Archived season %d to %s (%d KB)' % (
+        season_id, path, os.path.getsize(path) // 1024))
+    paths.append(path)
+  return paths
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--keep', type=int, default=1,
+                      help='Number of newest seasons to keep live.')
+  parser.add_argument('--league', type=int, default=database.DEFAULT_LEAGUE)
+  parser.add_argument('--db', default=database.DATABASE_PATH,
+                      help='Database path of the default league.')
+  args = parser.parse_args()
+
+  db = database.Database(database.shard_path(args.league, args.db))
+  db.create_tables()
+  if archive_seasons(db, keep=args.keep):
+    # Return the pages of the archived rows to the file system.
+    db.ex('VACUUM')
+
+
+if __name__ == '__main__':
+  main()
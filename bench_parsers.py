@@ -0,0 +1,120 @@
+"""Compare HTML parser backends on timetoscore pages.
+
+For every backend in util.PARSERS, checks that the fields scraped from season
+stats pages and scoresheets match html5lib (the reference backend, always a
+full parse) and reports the parse time. Pages are parsed the way the scraper
+does, i.e. with the partial-parse strainers for lxml and html.parser.
+
+Offline, e.g. in CI, over every stats page and scoresheet recorded with
+bench_sync.py --mode record (exits non-zero on a mismatch):
+
+  python bench_parsers.py --recordings /tmp/recordings
+
+Or live, fetching a season stats page and a scoresheet once:
+
+  python bench_parsers.py --season 66 --game_id 400000 --repeat 10
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import requests
+
+import sharks_ice_lib as sil
+import util
+
+REFERENCE_PARSER = 'html5lib'
+
+
+def fetch(url: str, params: dict[str, str]) -> bytes:
+  return requests.get(url, params=params, headers=util.HEADERS).content
+
+
+def time_parse(fn, repeat: int):
+  """Returns (result, median seconds) of calling fn repeat times."""
+  times = []
+  result = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = fn()
+    times.append(time.perf_counter() - start)
+  return result, statistics.median(times)
+
+
+def parse_divisions(content: bytes, season_id: int, parser: str):
+  return sil.parse_divisions_page(content, season_id, parser=parser)
+
+
+def parse_game_dt(content: bytes, parser: str):
+  return sil.parse_game_dt(util.parse_html(
+      content, parser=parser, parse_only=sil.GAME_DATE_STRAINER))
+
+
+def compare(name: str, parse, repeat: int) -> bool:
+  """Parses a page with every backend, returns whether all results match."""
+  results = {}
+  times = []
+  for parser in util.PARSERS:
+    results[parser], seconds = time_parse(lambda: parse(parser), repeat)
+    times.append('%s %.1f ms' % (parser, seconds * 1000))
+  print('%-40s %s' % (name, '  '.join(times)))
+  reference = results[REFERENCE_PARSER]
+  ok = True
+  for parser, result in results.items():
+    if result != reference:
+      ok = False
+      print('MISMATCH: %s %s differs from %s: %s != %s' % (
+          name, parser, REFERENCE_PARSER, result, reference))
+  return ok
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__)
+  arg_parser.add_argument('--recordings', default=None,
+                          help='Compare the pages recorded here, offline.')
+  arg_parser.add_argument('--season', type=int, default=66)
+  arg_parser.add_argument('--game_id', type=int, default=None)
+  arg_parser.add_argument('--repeat', type=int, default=5)
+  args = arg_parser.parse_args()
+
+  if args.recordings:
+    pages = [
+        (url, params, content)
+        for url, params, content in util.list_recordings(args.recordings)
+        if url in (sil.MAIN_STATS_URL, sil.GAME_URL)]
+  else:
+    if args.game_id is None:
+      arg_parser.error('--game_id is required without --recordings')
+    stats_params = dict(league=1, season=args.season)
+    game_params = dict(game_id=args.game_id)
+    pages = [
+        (sil.MAIN_STATS_URL, stats_params,
+         fetch(sil.MAIN_STATS_URL, stats_params)),
+        (sil.GAME_URL, game_params, fetch(sil.GAME_URL, game_params)),
+    ]
+  if not pages:
+    print('No stats pages or scoresheets to compare.')
+    sys.exit(1)
+
+  ok = True
+  for url, params, content in pages:
+    if url == sil.MAIN_STATS_URL:
+      season_id = int(params['season'])
+      ok &= compare(
+          'season %d divisions (%d bytes)' % (season_id, len(content)),
+          lambda parser: parse_divisions(content, season_id, parser),
+          args.repeat)
+    else:
+      ok &= compare(
+          'game %s date (%d bytes)' % (params['game_id'], len(content)),
+          lambda parser: parse_game_dt(content, parser),
+          args.repeat)
+  if not ok:
+    sys.exit(1)
+  print('All parsers produced identical fields on %d pages.' % len(pages))
+
+
+if __name__ == '__main__':
+  main()
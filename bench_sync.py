@@ -0,0 +1,96 @@
+"""End-to-end Syncer ingestion benchmark with offline record/replay.
+
+Record every upstream page of a live sync once (needs network and Chrome):
+
+  python bench_sync.py --mode record --recordings /tmp/recordings
+
+Then replay it deterministically offline, e.g. in CI:
+
+  python bench_sync.py --mode replay --recordings /tmp/recordings
+
+Each run syncs into a fresh database and reports total wall time, time per
+stage and rows written per second. Rows are those Syncer writes, not the rows
+the database triggers add.
+"""
+
+import argparse
+import collections
+import os
+import tempfile
+import time
+
+import database
+import sharks_ice_lib as sil
+import util
+
+
+class StageTimer:
+  """Accumulates wall time and rows written per sync stage."""
+
+  def __init__(self):
+    self.seconds = collections.defaultdict(float)
+    self.rows = collections.defaultdict(int)
+    self.calls = collections.defaultdict(int)
+
+  def wrap(self, stage: str, fn):
+    def wrapped(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return fn(*args, **kwargs)
+      finally:
+        self.seconds[stage] += time.perf_counter() - start
+        self.calls[stage] += 1
+    return wrapped
+
+  def count_rows(self, stage: str, write_fn):
+    """Wraps a Syncer write_* method, which returns the rows it wrote."""
+    def wrapped(*args, **kwargs):
+      rows = write_fn(*args, **kwargs)
+      self.rows[stage] += rows
+      return rows
+    return wrapped
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--mode', choices=('live',) + util.RECORDING_MODES,
+                      default='replay')
+  parser.add_argument('--recordings', default=util.RECORDING_DIR)
+  parser.add_argument('--min_season', type=int, default=60)
+  parser.add_argument('--db', default=None,
+                      help='Database path, defaults to a fresh temp file.')
+  args = parser.parse_args()
+
+  util.set_recording(None if args.mode == 'live' else args.mode,
+                     args.recordings)
+  db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_sync.db')
+  db = database.Database(db_path)
+  db.create_tables()
+
+  syncer = sil.Syncer(db)
+  syncer.set_min_season(args.min_season)
+  timer = StageTimer()
+  syncer.sync_season_teams = timer.wrap('teams', syncer.sync_season_teams)
+  syncer.sync_season_games = timer.wrap('games', syncer.sync_season_games)
+  syncer.write_season_teams = timer.count_rows(
+      'teams', syncer.write_season_teams)
+  syncer.write_season_games = timer.count_rows(
+      'games', syncer.write_season_games)
+
+  start = time.perf_counter()
+  syncer.sync()
+  total = time.perf_counter() - start
+
+  total_rows = sum(timer.rows.values())
+  print('Database: %s' % db_path)
+  for stage in timer.seconds:
+    seconds = timer.seconds[stage]
+    print('%-6s %3d calls %8.2f s %8d rows %10.1f rows/s' % (
+        stage, timer.calls[stage], seconds, timer.rows[stage],
+        timer.rows[stage] / seconds if seconds else 0))
+  print('total  %18.2f s %8d rows %10.1f rows/s' % (
+      total, total_rows, total_rows / total if total else 0))
+
+
+if __name__ == '__main__':
+  main()
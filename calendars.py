@@ -0,0 +1,169 @@
+"""iCalendar feeds of team schedules, generated from the Games table.
+
+Calendar clients poll their feeds constantly, so feeds are generated once and
+kept serialized per set of teams together with a weak ETag over their content.
+The cache is checked against the Changes log at most once per refresh
+interval, and only the feeds of teams with changed games are dropped.
+"""
+
+import collections
+import datetime
+import hashlib
+import json
+import threading
+import time
+
+import database
+import livebarn
+
+REFRESH_INTERVAL = 30.0
+# Feeds kept per database, the least recently generated are dropped first.
+MAX_FEEDS = 10000
+GAME_DURATION = datetime.timedelta(minutes=75)
+PRODID = '-//sharks_ice_api//Team Schedules//EN'
+
+
+class Feed:
+  """A serialized feed and its validators."""
+
+  def __init__(self, body: bytes, etag: str, last_modified: datetime.datetime):
+    self.body = body
+    self.etag = etag
+    self.last_modified = last_modified
+
+
+def escape_text(text: str) -> str:
+  return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+          .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def fold_line(line: str) -> str:
+  """Folds a content line into lines of at most 75 octets."""
+  lines = []
+  current = ''
+  size = 0
+  for char in line:
+    char_size = len(char.encode('utf-8'))
+    if size + char_size > 75:
+      lines.append(current)
+      current = ' '
+      size = 1
+    current += char
+    size += char_size
+  lines.append(current)
+  return '\r\n'.join(lines)
+
+
+def format_dt(dt: datetime.datetime) -> str:
+  return dt.strftime('%Y%m%dT%H%M%S')
+
+
+def get_location(rink: str) -> str:
+  """Full rink name, restoring the 'San Jose ' prefix stripped by Syncer."""
+  if 'San Jose ' + rink in livebarn.LIVEBARN_RINKS:
+    return 'San Jose ' + rink
+  return rink
+
+
+def build_event(game: dict, dtstamp: str) -> list[str]:
+  start = datetime.datetime.fromisoformat(game['start_time'])
+  description = [game['level']]
+  if game['home_goals'] is not None and game['away_goals'] is not None:
+    description.append('Final: %s %s, %s %s' % (
+        game['away'], game['away_goals'], game['home'], game['home_goals']))
+  return [
+      'BEGIN:VEVENT',
+      'UID:game-%s@sharks_ice_api' % game['game_id'],
+      'DTSTAMP:%s' % dtstamp,
+      # Floating times, start_time is local to the rinks.
+      'DTSTART:%s' % format_dt(start),
+      'DTEND:%s' % format_dt(start + GAME_DURATION),
+      'SUMMARY:%s' % escape_text('%s @ %s' % (game['away'], game['home'])),
+      'LOCATION:%s' % escape_text(get_location(game['rink'])),
+      'DESCRIPTION:%s' % escape_text('\n'.join(description)),
+      'END:VEVENT',
+  ]
+
+
+def build_calendar(
+    name: str, games: list[dict], dtstamp: datetime.datetime) -> bytes:
+  stamp = dtstamp.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+  lines = [
+      'BEGIN:VCALENDAR',
+      'VERSION:2.0',
+      'PRODID:%s' % PRODID,
+      'CALSCALE:GREGORIAN',
+      'METHOD:PUBLISH',
+      'X-WR-CALNAME:%s' % escape_text(name),
+  ]
+  for game in games:
+    lines.extend(build_event(game, stamp))
+  lines.append('END:VCALENDAR')
+  return ('\r\n'.join(fold_line(l) for l in lines) + '\r\n').encode('utf-8')
+
+
+class CalendarCache:
+  """Serialized team feeds of a database, invalidated by syncs."""
+
+  def __init__(
+      self,
+      db_path: str,
+      refresh_interval: float = REFRESH_INTERVAL,
+      max_feeds: int = MAX_FEEDS,
+  ):
+    self._db_path = db_path
+    self._refresh_interval = refresh_interval
+    self._max_feeds = max_feeds
+    self._lock = threading.Lock()
+    self._feeds = collections.OrderedDict()
+    self._seq = None
+    self._checked = 0.0
+
+  def _invalidate(self, db: database.Database):
+    seq = db.get_latest_change()
+    if self._seq is None or seq < self._seq:
+      self._feeds.clear()
+    elif seq > self._seq:
+      team_ids = db.get_changed_teams(self._seq)
+      if team_ids is None:
+        # Changes we have not seen were pruned.
+        self._feeds.clear()
+      else:
+        for key in [k for k in self._feeds if k & team_ids]:
+          del self._feeds[key]
+    self._seq = seq
+    self._checked = time.monotonic()
+
+  def _build(self, db: database.Database, team_ids: frozenset[int]) -> Feed:
+    games = db.get_team_schedule(
+        sorted(team_ids), min_season=db.get_current_season())
+    names = db.get_team_names(sorted(team_ids))
+    name = ', '.join(names[t] for t in sorted(names))
+    # Weak since DTSTAMP differs between workers generating the same feed.
+    etag = hashlib.sha1(json.dumps([name, games]).encode('utf-8')).hexdigest()
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    return Feed(build_calendar(name, games, now), etag, now)
+
+  def get(self, team_ids: set[int]) -> Feed:
+    """Feed of the games of team_ids in the current and later seasons.
+
+    Cache hits within the refresh interval do not touch the database.
+    """
+    team_ids = frozenset(team_ids)
+    with self._lock:
+      refresh = time.monotonic() - self._checked >= self._refresh_interval
+      if not refresh and team_ids in self._feeds:
+        return self._feeds[team_ids]
+      db = database.Database(self._db_path)
+      try:
+        if refresh:
+          self._invalidate(db)
+        feed = self._feeds.get(team_ids)
+        if feed is None:
+          feed = self._build(db, team_ids)
+          self._feeds[team_ids] = feed
+          while len(self._feeds) > self._max_feeds:
+            self._feeds.popitem(last=False)
+      finally:
+        db.close()
+      return feed
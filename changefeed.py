@@ -0,0 +1,185 @@
+"""Push feed of changed games and standings for Server-Sent Events clients.
+
+Syncer writes go through triggers that log every game and TeamStats row whose
+content actually changed to the Changes table (see Database.create_tables).
+A single dispatcher thread per process polls that log, loads the changed rows
+once and fans them out to the subscribers of the affected teams, so idle
+subscribers cost one queue each and no database work.
+
+Subscriber streams wait on their queue, which holds a thread per subscriber
+under a threaded server. Serve the API through wsgi.py, which monkey-patches
+the standard library with gevent first, so the queues, the dispatcher and the
+sockets are cooperative and an idle subscriber is a parked greenlet instead.
+"""
+
+import collections
+import datetime
+import json
+import queue
+import threading
+import time
+
+import database
+
+POLL_INTERVAL = 2.0
+KEEPALIVE_INTERVAL = 15.0
+# Events buffered per subscriber before it is considered stalled and dropped.
+# Dropped clients reconnect with Last-Event-ID and catch up from the log.
+MAX_PENDING_EVENTS = 100
+MAX_CHANGE_AGE = datetime.timedelta(days=1)
+# Changes replayed to a reconnecting subscriber, beyond that it is reset.
+MAX_REPLAY_CHANGES = 10000
+
+
+class Subscription:
+  """A subscriber's team ids and pending events."""
+
+  def __init__(self, team_ids: set[int]):
+    self.team_ids = team_ids
+    self.events = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+    self.closed = False
+
+
+def build_events(db: database.Database, changes: list[dict[str, int]]):
+  """Loads the rows referenced by changes.
+
+  Returns:
+    Tuple of (last seq, dict of team id to {'games': [...], 'teams': [...]}).
+  """
+  game_ids = set()
+  season_teams = collections.defaultdict(set)
+  for change in changes:
+    if change['kind'] == 'game':
+      game_ids.add(change['game_id'])
+    else:
+      season_teams[change['season_id']].add(change['team_id'])
+
+  events = collections.defaultdict(lambda: {'games': [], 'teams': []})
+  for game in db.get_games(sorted(game_ids)):
+    for team_id in {game['home_id'], game['away_id']}:
+      events[team_id]['games'].append(game)
+  for season_id, team_ids in season_teams.items():
+    for team in db.get_team_stats(sorted(team_ids), season_id=season_id):
+      events[team['team_id']]['teams'].append(team)
+  return changes[-1]['seq'], events
+
+
+def merge_events(events: dict[int, dict[str, list]], team_ids: set[int]):
+  """Merges the per-team events of a subscriber into one event payload."""
+  payload = {'games': [], 'teams': []}
+  seen_games = set()
+  for team_id in team_ids & events.keys():
+    for game in events[team_id]['games']:
+      if game['game_id'] not in seen_games:
+        seen_games.add(game['game_id'])
+        payload['games'].append(game)
+    payload['teams'].extend(events[team_id]['teams'])
+  return payload
+
+
+def format_event(seq: int, payload: dict[str, list]) -> str:
+  return 'id: %d\nevent: change\ndata: %s\n\n' % (seq, json.dumps(payload))
+
+
+def format_reset(seq: int) -> str:
+  """Tells a client that it missed changes and must reload its teams."""
+  return 'id: %d\nevent: reset\ndata: {}\n\n' % seq
+
+
+def replay(db: database.Database, team_ids: set[int], last_event_id: int):
+  """Yields the events a subscriber missed after last_event_id.
+
+  If the log no longer holds all of them, yields a reset event instead.
+  """
+  changes = db.get_changes(last_event_id, limit=MAX_REPLAY_CHANGES + 1)
+  if (len(changes) > MAX_REPLAY_CHANGES or
+      db.changes_pruned(last_event_id)):
+    yield format_reset(db.get_latest_change())
+    return
+  missed = [c for c in changes if c['team_id'] in team_ids]
+  if missed:
+    _, events = build_events(db, missed)
+    yield format_event(changes[-1]['seq'], merge_events(events, team_ids))
+
+
+class ChangeFeed:
+  """Polls the Changes log and dispatches events to subscribers."""
+
+  def __init__(self, db_path: str, poll_interval: float = POLL_INTERVAL):
+    self._db_path = db_path
+    self._poll_interval = poll_interval
+    self._lock = threading.Lock()
+    self._by_team = collections.defaultdict(set)
+    self._thread = None
+
+  def subscribe(self, team_ids: set[int]) -> Subscription:
+    subscription = Subscription(team_ids)
+    with self._lock:
+      for team_id in team_ids:
+        self._by_team[team_id].add(subscription)
+      if self._thread is None:
+        # Started lazily so that it runs in the uWSGI worker, not the master.
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    return subscription
+
+  def unsubscribe(self, subscription: Subscription):
+    subscription.closed = True
+    with self._lock:
+      for team_id in subscription.team_ids:
+        self._by_team[team_id].discard(subscription)
+        if not self._by_team[team_id]:
+          del self._by_team[team_id]
+
+  def _dispatch(self, seq: int, events: dict[int, dict[str, list]]):
+    with self._lock:
+      subscriptions = set()
+      for team_id in events:
+        subscriptions.update(self._by_team.get(team_id, ()))
+    for subscription in subscriptions:
+      payload = merge_events(events, subscription.team_ids)
+      try:
+        subscription.events.put_nowait(format_event(seq, payload))
+      except queue.Full:
+        self.unsubscribe(subscription)
+
+  def _run(self):
+    db = database.Database(self._db_path)
+    seq = db.get_latest_change()
+    while True:
+      time.sleep(self._poll_interval)
+      try:
+        changes = db.get_changes(seq)
+        if not changes:
+          continue
+        seq, events = build_events(db, changes)
+        self._dispatch(seq, events)
+      except Exception as e:  # pylint: disable=broad-except
+        # Keep the feed alive, e.g. through a locked or replaced database.
+        print('Change feed failed: %s' % e)
+
+  def stream(self, team_ids: set[int], last_event_id: int | None = None):
+    """Yields SSE messages for changes to team_ids until disconnected.
+
+    Args:
+      team_ids: Teams to send game and standings changes for.
+      last_event_id: Seq of the last event the client received, to replay
+        the changes it missed while reconnecting. Clients that missed more
+        than the log holds get a reset event.
+    """
+    subscription = self.subscribe(team_ids)
+    try:
+      yield 'retry: %d\n\n' % (self._poll_interval * 1000)
+      if last_event_id is not None:
+        db = database.Database(self._db_path)
+        try:
+          yield from replay(db, team_ids, last_event_id)
+        finally:
+          db.close()
+      while not subscription.closed:
+        try:
+          yield subscription.events.get(timeout=KEEPALIVE_INTERVAL)
+        except queue.Empty:
+          yield ': keepalive\n\n'
+    finally:
+      self.unsubscribe(subscription)
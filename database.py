@@ -1,19 +1,233 @@
 """Wrapper class and utils for database."""
 
+import collections
 import datetime
 import json
+import os
+import re
 import sqlite3
+import time
 from typing import Any
+import urllib.parse
+import zlib
+
+import util
+
+
+DATABASE_PATH = "hockey_league.db"
+
+# timetoscore league of DATABASE_PATH. Other leagues get their own shard file.
+DEFAULT_LEAGUE = 1
+
+
+def shard_path(league: int, path: str = DATABASE_PATH) -> str:
+  """Path of a league's database, next to path and named after it."""
+  if league == DEFAULT_LEAGUE:
+    return path
+  root, ext = os.path.splitext(path)
+  return "%s_%d%s" % (root, league, ext)
+
+
+def archive_path(season_id: int, path: str = DATABASE_PATH) -> str:
+  """Path of a season's archive, next to the database path it was moved from."""
+  root, ext = os.path.splitext(path)
+  return "%s_season_%d%s" % (root, season_id, ext)
+
+# Tables copied to a season's archive by Database.archive_season, with the
+# condition selecting the season's rows and the JSON columns that are stored
+# zlib compressed there. Teams and Divisions are also kept in the live
+# database.
+ARCHIVE_TABLES = {
+    "Seasons": ("id = :season", ()),
+    "Divisions": ("""(id, conference_id) IN (
+        SELECT division_id, conference_id FROM TeamStats
+          WHERE season_id = :season)""", ()),
+    "Teams": ("""id IN (
+        SELECT team_id FROM TeamStats WHERE season_id = :season
+        UNION SELECT home_id FROM Games WHERE season_id = :season
+        UNION SELECT away_id FROM Games WHERE season_id = :season)""", ()),
+    "TeamStats": ("season_id = :season", ("stats",)),
+    "Games": ("season_id = :season", ("info", "stats")),
+    "GameEvents": (
+        "game_id IN (SELECT id FROM Games WHERE season_id = :season)",
+        ("event",)),
+}
+# Databases SQLite attaches at most by default. Archives beyond it are
+# detached least recently used first.
+MAX_ATTACHED = 10
+
+
+def deflate(text: str | None) -> bytes | None:
+  return None if text is None else zlib.compress(text.encode("utf-8"), 9)
+
+
+def inflate(blob: bytes | None) -> str | None:
+  return None if blob is None else zlib.decompress(blob).decode("utf-8")
+
+
+def is_archive(schema: str) -> bool:
+  return schema.startswith("archive_")
+
+
+def json_column(schema: str, column: str) -> str:
+  """SQL expression of a JSON column, decompressed in archives."""
+  return f"inflate({column})" if is_archive(schema) else column
+
+# TeamSearch rowid of a Teams row: its latest season in the high and its id in
+# the low 32 bits.
+SEARCH_ROWID = "(COALESCE({team}.latest_season, 0) << 32 | {team}.id)"
+TEAM_ID_MASK = 0xffffffff
+# Most recent matches of a search that are ranked by relevance.
+SEARCH_CANDIDATES = 100
+
+# Typed TeamStats columns of the standings keys in the stats dict. Any other
+# stats keys are kept as JSON in TeamStats.stats.
+STANDINGS_COLUMNS = {
+    "gamesPlayed": ("games_played", "INTEGER"),
+    "wins": ("wins", "INTEGER"),
+    "ties": ("ties", "INTEGER"),
+    "losses": ("losses", "INTEGER"),
+    "overtimeLosses": ("overtime_losses", "INTEGER"),
+    "points": ("points", "INTEGER"),
+    "streak": ("streak", "TEXT"),
+    "tieBreaker": ("tie_breaker", "TEXT"),
+    # Stored as the number, e.g. 2 for "2nd".
+    "place": ("place", "INTEGER"),
+}
+STANDINGS_COLUMN_NAMES = [c for c, _ in STANDINGS_COLUMNS.values()]
+
+# Standings order within a division. Ties on points are broken by the place
+# the league assigns, which applies its tie breakers.
+STANDINGS_ORDER = "ts.points DESC, ts.place"
+STANDINGS_INDEX = """CREATE INDEX TeamStatsStandings ON TeamStats
+  (season_id, division_id, conference_id, points DESC, place)"""
+
+
+def split_team_stats(stats: dict[str, Any]):
+  """Splits a stats dict into typed standings column values and extra JSON."""
+  extra = dict(stats)
+  values = []
+  for key, (_, column_type) in STANDINGS_COLUMNS.items():
+    value = extra.pop(key, None)
+    if value is not None:
+      if key == "place" and isinstance(value, str):
+        value = int(value.rstrip("stndrh"))
+      value = int(value) if column_type == "INTEGER" else str(value)
+    values.append(value)
+  return values, json.dumps(extra)
+
+
+def join_team_stats(values: list[Any], extra: str):
+  """Inverse of split_team_stats."""
+  stats = {}
+  for key, value in zip(STANDINGS_COLUMNS, values):
+    if value is not None:
+      stats[key] = util.ordinal(value) if key == "place" else value
+  if extra != "{}":
+    stats.update(json.loads(extra))
+  return stats
+
+
+# Keys of the game dicts returned by get_team_games.
+GAME_KEYS = [
+    "game_id",
+    "start_time",
+    "rink",
+    "level",
+    "home",
+    "home_id",
+    "away",
+    "away_id",
+]
 
 
 # Connect to the database (or create it if it doesn't exist)
 class Database:
   """Wrapper class for Database."""
 
-  def __init__(self):
-    self._conn = sqlite3.connect("hockey_league.db")
+  def __init__(self, path: str = DATABASE_PATH):
+    self._path = path
+    # URIs are enabled to attach archives read-only, see _attach_archive.
+    self._conn = sqlite3.connect(path, uri=True)
     self._conn.execute("PRAGMA foreign_keys = 1")
+    self._conn.create_function("deflate", 1, deflate, deterministic=True)
+    self._conn.create_function("inflate", 1, inflate, deterministic=True)
     self._cursor = self._conn.cursor()
+    # Schema name to league of the databases queried by cross-league methods,
+    # see attach_leagues.
+    self._shards = {"main": None}
+    # (Shard schema, season id) to the schema of its attached archive.
+    self._archives = collections.OrderedDict()
+
+  def attach_leagues(self, leagues: list[int], path: str = DATABASE_PATH):
+    """Attaches league shards for get_team_games and search_teams.
+
+    Their results then span all leagues and carry a 'league' key. Shards that
+    have not been synced yet are skipped.
+    """
+    self._shards = {}
+    for league in leagues:
+      league_path = shard_path(league, path)
+      if os.path.abspath(league_path) == os.path.abspath(self._path):
+        self._shards["main"] = league
+      elif os.path.exists(league_path):
+        schema = "league_%d" % league
+        self._cursor.execute("ATTACH DATABASE ? AS %s" % schema, (league_path,))
+        self._shards[schema] = league
+
+  def _attach_archive(self, shard: str, season_id: int, archive: str) -> str:
+    """Attaches the archive of a season of a shard, returns its schema."""
+    key = (shard, season_id)
+    if key in self._archives:
+      self._archives.move_to_end(key)
+      return self._archives[key]
+    while self._archives and (
+        len(self._shards) + len(self._archives) >= MAX_ATTACHED):
+      _, schema = self._archives.popitem(last=False)
+      self._cursor.execute("DETACH DATABASE %s" % schema)
+    self._cursor.execute("PRAGMA database_list")
+    shard_file = {row[1]: row[2] for row in self._cursor.fetchall()}[shard]
+    # Archives are stored next to their shard and never written again.
+    path = os.path.join(os.path.dirname(shard_file), archive)
+    schema = "archive_%s_%d" % (shard, season_id)
+    self._cursor.execute("ATTACH DATABASE ? AS %s" % schema, (
+        "file:%s?immutable=1" % urllib.parse.quote(path),))
+    self._archives[key] = schema
+    return schema
+
+  def _archive_schemas(
+      self,
+      where: str = "1",
+      params: tuple[Any, ...] = (),
+      shards: list[str] | None = None,
+  ):
+    """Attaches the archives of the seasons matching a condition on Seasons.
+
+    Attaching an archive may detach an earlier one, so query every archive
+    before moving on to the next.
+
+    Yields:
+      (archive schema, league) in season order.
+    """
+    archives = []
+    for shard in shards or list(self._shards):
+      self._cursor.execute(f"""
+      SELECT id, archive FROM {shard}.Seasons
+        WHERE archive IS NOT NULL AND ({where})
+        ORDER BY id;""", params)
+      archives.extend(
+          (shard, season_id, archive)
+          for season_id, archive in self._cursor.fetchall())
+    for shard, season_id, archive in archives:
+      yield (self._attach_archive(shard, season_id, archive),
+             self._shards.get(shard))
+
+  def _season_schema(self, season_id: int) -> str:
+    """Schema holding a season, attaching its archive if it has one."""
+    for schema, _ in self._archive_schemas(
+        "id = ?", (season_id,), shards=["main"]):
+      return schema
+    return "main"
 
   def __del__(self):
     self._conn.close()
@@ -81,9 +295,268 @@ class Database:
     )
     """)
 
+    # Log of game and standings rows whose content changed, one row per
+    # affected team. Filled by the triggers below, read by changefeed.
+    self._cursor.execute("""
+    CREATE TABLE IF NOT EXISTS Changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        season_id INTEGER NOT NULL,
+        game_id INTEGER,
+        team_id INTEGER,
+        changed_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+    )
+    """)
+    self._cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS GamesChanged BEFORE INSERT ON Games
+    WHEN NOT EXISTS (
+      SELECT 1 FROM Games WHERE
+        id = NEW.id AND
+        season_id IS NEW.season_id AND
+        level IS NEW.level AND
+        start_dt IS NEW.start_dt AND
+        rink IS NEW.rink AND
+        home IS NEW.home AND
+        away IS NEW.away AND
+        home_id IS NEW.home_id AND
+        away_id IS NEW.away_id AND
+        info IS NEW.info)
+    BEGIN
+      INSERT INTO Changes (kind, season_id, game_id, team_id) VALUES
+        ('game', NEW.season_id, NEW.id, NEW.home_id),
+        ('game', NEW.season_id, NEW.id, NEW.away_id);
+    END
+    """)
+    self._cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS GameStatsChanged AFTER UPDATE OF stats ON Games
+    WHEN OLD.stats IS NOT NEW.stats
+    BEGIN
+      INSERT INTO Changes (kind, season_id, game_id, team_id) VALUES
+        ('game', NEW.season_id, NEW.id, NEW.home_id),
+        ('game', NEW.season_id, NEW.id, NEW.away_id);
+    END
+    """)
+    self._add_standings_columns()
+    self._add_season_columns()
+    self._add_archive_index()
+    self._cursor.execute("DROP TRIGGER IF EXISTS TeamStatsChanged")
+    self._cursor.execute(f"""
+    CREATE TRIGGER TeamStatsChanged BEFORE INSERT ON TeamStats
+    WHEN NOT EXISTS (
+      SELECT 1 FROM TeamStats WHERE
+        season_id = NEW.season_id AND
+        division_id = NEW.division_id AND
+        conference_id = NEW.conference_id AND
+        team_id = NEW.team_id AND
+        {" AND ".join(f"{c} IS NEW.{c}" for c in STANDINGS_COLUMN_NAMES)} AND
+        stats IS NEW.stats)
+    BEGIN
+      INSERT INTO Changes (kind, season_id, team_id) VALUES
+        ('team_stats', NEW.season_id, NEW.team_id);
+    END
+    """)
+
+    # Metrics of every season and kind ('teams' or 'games') synced per
+    # Syncer.sync run. Times are in seconds, started_at since the epoch.
+    self._cursor.execute("""
+    CREATE TABLE IF NOT EXISTS SyncRuns (
+        run_id INTEGER NOT NULL,
+        season_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        fetch_seconds REAL NOT NULL,
+        parse_seconds REAL NOT NULL,
+        write_seconds REAL NOT NULL,
+        pages INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        rows INTEGER NOT NULL,
+        error TEXT,
+        PRIMARY KEY (run_id, season_id, kind)
+    )
+    """)
+
+    # Goals and penalties of games with stats, with their estimated wall
+    # clock times and LiveBarn links, see livebarn.build_timelines. Stale
+    # once their game changes, so the trigger below drops them then.
+    self._cursor.execute("""
+    SELECT 1 FROM sqlite_master
+      WHERE type = 'table' AND name = 'GameTimelines';""")
+    timelines_exist = self._cursor.fetchone() is not None
+    self._cursor.execute("""
+    CREATE TABLE IF NOT EXISTS GameEvents (
+        game_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        period TEXT,
+        game_time TEXT,
+        estimated_time TEXT,
+        livebarn TEXT,
+        event TEXT,
+        PRIMARY KEY (game_id, kind, idx)
+    )
+    """)
+    # Games whose timeline is built, including those without goals or
+    # penalties, which have no GameEvents rows.
+    self._cursor.execute("""
+    CREATE TABLE IF NOT EXISTS GameTimelines (
+        game_id INTEGER PRIMARY KEY,
+        built_at REAL NOT NULL
+    )
+    """)
+    if not timelines_exist:
+      self._cursor.execute("""
+      INSERT INTO GameTimelines (game_id, built_at)
+        SELECT DISTINCT game_id, ? FROM GameEvents;""", (time.time(),))
+    self._cursor.execute("DROP TRIGGER IF EXISTS GameEventsStale")
+    self._cursor.execute("""
+    CREATE TRIGGER GameEventsStale AFTER INSERT ON Changes
+    WHEN NEW.kind = 'game'
+    BEGIN
+      DELETE FROM GameEvents WHERE game_id = NEW.game_id;
+      DELETE FROM GameTimelines WHERE game_id = NEW.game_id;
+    END
+    """)
+
+    # Full text index of team names for type-ahead search. Rowids are
+    # SEARCH_ROWID of the team, so matches can be read latest season first
+    # without ranking all of them. Kept in sync with Teams and TeamStats by
+    # the triggers below.
+    self._cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS TeamSearch USING fts5(
+        name,
+        prefix = '1 2 3'
+    )
+    """)
+    self._add_team_latest_season()
+    self._cursor.execute("DROP TRIGGER IF EXISTS TeamSearchInsert")
+    self._cursor.execute(f"""
+    CREATE TRIGGER TeamSearchInsert AFTER INSERT ON Teams
+    BEGIN
+      INSERT INTO TeamSearch (rowid, name)
+        VALUES ({SEARCH_ROWID.format(team="NEW")}, NEW.name);
+    END
+    """)
+    self._cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS TeamSearchUpdate
+    AFTER UPDATE OF name, latest_season ON Teams
+    WHEN OLD.name IS NOT NEW.name
+      OR OLD.latest_season IS NOT NEW.latest_season
+    BEGIN
+      DELETE FROM TeamSearch WHERE rowid = {SEARCH_ROWID.format(team="OLD")};
+      INSERT INTO TeamSearch (rowid, name)
+        VALUES ({SEARCH_ROWID.format(team="NEW")}, NEW.name);
+    END
+    """)
+    self._cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS TeamLatestSeason AFTER INSERT ON TeamStats
+    BEGIN
+      UPDATE Teams SET latest_season = NEW.season_id
+        WHERE id = NEW.team_id
+          AND (latest_season IS NULL OR latest_season < NEW.season_id);
+    END
+    """)
+
+    self._cursor.execute(
+        "CREATE INDEX IF NOT EXISTS TeamsName ON Teams (name)")
+    self._cursor.execute("""
+    SELECT sql FROM sqlite_master
+      WHERE type = 'index' AND name = 'TeamStatsStandings';""")
+    row = self._cursor.fetchone()
+    if row is None or row[0] != STANDINGS_INDEX:
+      # Rebuilt when STANDINGS_ORDER changed.
+      self._cursor.execute("DROP INDEX IF EXISTS TeamStatsStandings")
+      self._cursor.execute(STANDINGS_INDEX)
+    self._cursor.execute(
+        "CREATE INDEX IF NOT EXISTS TeamStatsTeam"
+        " ON TeamStats (team_id, season_id)")
+
     # Commit the changes and close the connection
     self._conn.commit()
 
+  def _add_standings_columns(self):
+    """Adds the typed standings columns to TeamStats and backfills them."""
+    self._cursor.execute("PRAGMA table_info(TeamStats)")
+    existing = {row[1] for row in self._cursor.fetchall()}
+    for column, column_type in STANDINGS_COLUMNS.values():
+      if column not in existing:
+        self._cursor.execute(
+            f"ALTER TABLE TeamStats ADD COLUMN {column} {column_type}")
+    # Move standings out of the JSON of rows written before the columns.
+    keys = list(STANDINGS_COLUMNS)
+    assignments = ", ".join(
+        f"{column} = json_extract(stats, '$.{key}')"
+        for key, (column, _) in STANDINGS_COLUMNS.items() if key != "place")
+    self._cursor.execute(f"""
+    UPDATE TeamStats SET
+      {assignments},
+      place = CAST(rtrim(json_extract(stats, '$.place'), 'stndrh') AS INTEGER),
+      stats = json_remove(stats, {", ".join(f"'$.{k}'" for k in keys)})
+    WHERE {" OR ".join(f"json_type(stats, '$.{k}') IS NOT NULL" for k in keys)}
+    """)
+
+  def _add_team_latest_season(self):
+    """Adds Teams.latest_season and re-keys TeamSearch by it."""
+    self._cursor.execute("PRAGMA table_info(Teams)")
+    if "latest_season" in {row[1] for row in self._cursor.fetchall()}:
+      return
+    self._cursor.execute("ALTER TABLE Teams ADD COLUMN latest_season INTEGER")
+    self._cursor.execute("""
+    UPDATE Teams SET latest_season = (
+      SELECT MAX(season_id) FROM TeamStats WHERE team_id = Teams.id)""")
+    self._cursor.execute("DELETE FROM TeamSearch")
+    self._cursor.execute(f"""
+    INSERT INTO TeamSearch (rowid, name)
+      SELECT {SEARCH_ROWID.format(team="Teams")}, name FROM Teams""")
+
+  def _add_season_columns(self):
+    """Adds the date range of a season's games and its archive to Seasons."""
+    self._cursor.execute("PRAGMA table_info(Seasons)")
+    existing = {row[1] for row in self._cursor.fetchall()}
+    for column in ("start_date", "end_date", "archive"):
+      if column not in existing:
+        self._cursor.execute(f"ALTER TABLE Seasons ADD COLUMN {column} TEXT")
+
+  def _add_archive_index(self):
+    """Creates the live index of archived rows, see archive_season.
+
+    It lets team search and timelines attach only the archives they need.
+    Databases archived before it are indexed from their archives once.
+    """
+    self._cursor.execute("""
+    SELECT 1 FROM sqlite_master
+      WHERE type = 'table' AND name = 'ArchivedGames';""")
+    exists = self._cursor.fetchone() is not None
+    self._cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ArchivedGames (
+        id INTEGER PRIMARY KEY,
+        season_id INTEGER NOT NULL
+    )
+    """)
+    self._cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ArchivedTeamSeasons (
+        team_id INTEGER NOT NULL,
+        season_id INTEGER NOT NULL,
+        division_id INTEGER NOT NULL,
+        conference_id INTEGER NOT NULL,
+        PRIMARY KEY (team_id, season_id, division_id, conference_id)
+    ) WITHOUT ROWID
+    """)
+    if not exists:
+      for season_id in sorted(self.get_archived_seasons()):
+        self._index_archived_season(self._season_schema(season_id), season_id)
+
+  def _index_archived_season(self, schema: str, season_id: int):
+    """Adds the games and team divisions of a season to the archive index."""
+    self._cursor.execute(f"""
+    INSERT OR IGNORE INTO main.ArchivedGames (id, season_id)
+      SELECT id, season_id FROM {schema}.Games WHERE season_id = ?;""",
+        (season_id,))
+    self._cursor.execute(f"""
+    INSERT OR IGNORE INTO main.ArchivedTeamSeasons
+        (team_id, season_id, division_id, conference_id)
+      SELECT team_id, season_id, division_id, conference_id
+      FROM {schema}.TeamStats WHERE season_id = ?;""", (season_id,))
+
   def add_season(self, season_id: int, name: str):
     """Inserts season."""
     query = "INSERT OR REPLACE INTO SEASONS (id, name) VALUES (?, ?)"
@@ -91,6 +564,37 @@ class Database:
     self._conn.commit()
     return self._cursor.lastrowid
 
+  def ensure_season(self, season_id: int):
+    """Inserts a placeholder season, keeping the name of an existing one."""
+    query = "INSERT OR IGNORE INTO Seasons (id, name) VALUES (?, ?)"
+    self._cursor.execute(query, (season_id, str(season_id)))
+    self._conn.commit()
+
+  def set_season_dates(
+      self, season_id: int, start_date: datetime.date, end_date: datetime.date):
+    """Widens the stored date range of a season's games."""
+    query = """
+        INSERT INTO Seasons (id, name, start_date, end_date)
+          VALUES (?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+          start_date = MIN(COALESCE(start_date, excluded.start_date),
+                           excluded.start_date),
+          end_date = MAX(COALESCE(end_date, excluded.end_date),
+                         excluded.end_date)"""
+    self._cursor.execute(query, (
+        season_id, str(season_id), start_date.isoformat(),
+        end_date.isoformat()))
+    self._conn.commit()
+
+  def get_season_dates(self, season_id: int):
+    """Stored (start_date, end_date) of a season, None if unknown."""
+    self._cursor.execute(
+        "SELECT start_date, end_date FROM Seasons WHERE id = ?", (season_id,))
+    row = self._cursor.fetchone()
+    if row is None or row[0] is None:
+      return None
+    return tuple(datetime.date.fromisoformat(d) for d in row)
+
   def add_division(
       self,
       division_id: int,
@@ -114,9 +618,10 @@ class Database:
       name: str,
   ):
     """Inserts team."""
-    # Always override team stats.
+    # Keeps latest_season, which TeamStats inserts maintain.
     query = (
-        "INSERT OR REPLACE INTO Teams (id, name) VALUES (?, ?)"
+        "INSERT INTO Teams (id, name) VALUES (?, ?)"
+        " ON CONFLICT (id) DO UPDATE SET name = excluded.name"
     )
 
     self._cursor.execute(
@@ -139,9 +644,11 @@ class Database:
     # Always override team stats.
     query = (
         "INSERT OR REPLACE INTO TeamStats (season_id, division_id,"
-        " conference_id, team_id, stats) VALUES (?, ?, ?, ?, ?)"
+        f" conference_id, team_id, {', '.join(STANDINGS_COLUMN_NAMES)}, stats)"
+        f" VALUES (?, ?, ?, ?, {', '.join('?' * len(STANDINGS_COLUMNS))}, ?)"
     )
 
+    values, extra = split_team_stats(stats)
     try:
       self._cursor.execute(
           query,
@@ -150,7 +657,8 @@ class Database:
               division_id,
               conference_id,
               team_id,
-              json.dumps(stats),
+              *values,
+              extra,
           ),
       )
     except Exception as e:
@@ -178,6 +686,7 @@ class Database:
             id,
             season_id,
             level,
+            start_time,
             start_dt,
             rink,
             home,
@@ -185,7 +694,7 @@ class Database:
             away,
             away_id,
             info
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
 
     self._cursor.execute(
         query,
@@ -193,6 +702,7 @@ class Database:
             game_id,
             season_id,
             level,
+            start_dt.isoformat(),
             start_dt.timestamp() * 1000, # convert to micros
             rink,
             home,
@@ -215,13 +725,53 @@ class Database:
     self._conn.commit()
     return self._cursor.lastrowid
 
+  def start_sync_run(self) -> int:
+    """Returns the id of a new sync run."""
+    self._cursor.execute("SELECT MAX(run_id) FROM SyncRuns")
+    return (self._cursor.fetchone()[0] or 0) + 1
+
+  def add_sync_metrics(
+      self,
+      run_id: int,
+      season_id: int,
+      kind: str,
+      started_at: float,
+      fetch_seconds: float,
+      parse_seconds: float,
+      write_seconds: float,
+      pages: int,
+      bytes: int,  # pylint: disable=redefined-builtin
+      rows: int,
+      error: str | None,
+  ):
+    """Inserts the metrics of syncing one kind of data of a season."""
+    query = """
+        INSERT OR REPLACE INTO SyncRuns (
+            run_id,
+            season_id,
+            kind,
+            started_at,
+            fetch_seconds,
+            parse_seconds,
+            write_seconds,
+            pages,
+            bytes,
+            rows,
+            error
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+    self._cursor.execute(query, (
+        run_id, season_id, kind, started_at, fetch_seconds, parse_seconds,
+        write_seconds, pages, bytes, rows, error))
+    self._conn.commit()
+
   # Helper methods
-  def get_current_season(self):
-    self._cursor.execute('''SELECT MAX(id) from Seasons''')
+  def get_current_season(self, schema: str = "main"):
+    self._cursor.execute(f'''SELECT MAX(id) from {schema}.Seasons''')
     return self._cursor.fetchone()[0]
 
   def list_season_divisions(self, season_id):
-    self._cursor.execute("""
+    schema = self._season_schema(season_id)
+    self._cursor.execute(f"""
       SELECT DISTINCT
         s.id as season_id,
         s.name as season_name,
@@ -230,12 +780,13 @@ class Database:
         d.name as division_name,
         t.id as team_id,
         t.name as team_name
-      FROM TeamStats as ts
-        JOIN Divisions AS d ON (
+      FROM {schema}.TeamStats as ts
+        JOIN {schema}.Divisions AS d ON (
           d.id = ts.division_id AND d.conference_id = ts.conference_id)
-        JOIN Seasons AS s on ts.season_id = s.id
-        JOIN Teams as t ON ts.team_id = t.id
-        WHERE s.id = ?;""", (season_id, ))
+        JOIN {schema}.Seasons AS s on ts.season_id = s.id
+        JOIN {schema}.Teams as t ON ts.team_id = t.id
+        WHERE s.id = ?
+        ORDER BY d.name, t.name;""", (season_id, ))
     divisions = {}
     for row in self._cursor.fetchall():
       div_id = (row[2], row[3])
@@ -250,23 +801,87 @@ class Database:
         'team_id': row[5],
         'name': row[6]
       })
-    divisions = list(divisions.values())
-    # Sort by name and add season data.
-    for i in range(len(divisions)):
-      divisions[i]['teams'].sort(key=lambda a: a['name'])
-    divisions.sort(key=lambda a: a['name'])
     return {
       'season_id': row[0],
       'season_name': row[1],
-      'divisions': divisions,
+      'divisions': list(divisions.values()),
+    }
+
+  def get_standings(self, season_id: int, top: int | None = None):
+    """Divisions of a season with teams in standings order.
+
+    Args:
+      season_id: Season to list.
+      top: Only include the first top teams of every division.
+    """
+    schema = self._season_schema(season_id)
+    self._cursor.execute(f"""
+    SELECT * FROM (
+      SELECT
+        s.name as season_name,
+        d.id as division_id,
+        d.conference_id,
+        d.name as division_name,
+        t.id as team_id,
+        t.name as team_name,
+        ROW_NUMBER() OVER (
+          PARTITION BY ts.division_id, ts.conference_id
+          ORDER BY {STANDINGS_ORDER}) as rank,
+        {", ".join("ts." + c for c in STANDINGS_COLUMN_NAMES)},
+        {json_column(schema, "ts.stats")}
+      FROM {schema}.TeamStats as ts
+        JOIN {schema}.Divisions AS d ON (
+          d.id = ts.division_id AND d.conference_id = ts.conference_id)
+        JOIN {schema}.Seasons AS s on ts.season_id = s.id
+        JOIN {schema}.Teams as t ON ts.team_id = t.id
+        WHERE ts.season_id = ?
+    )
+    WHERE ? IS NULL OR rank <= ?
+    ORDER BY division_name, division_id, conference_id, rank;""",
+        (season_id, top, top))
+    season_name = None
+    divisions = {}
+    for row in self._cursor.fetchall():
+      season_name = row[0]
+      div_id = (row[1], row[2])
+      if div_id not in divisions:
+        divisions[div_id] = {
+        'division_id': row[1],
+        'conference_id': row[2],
+        'name': row[3],
+        'teams': []
+        }
+      divisions[div_id]['teams'].append({
+        'team_id': row[4],
+        'name': row[5],
+        'rank': row[6],
+        'stats': join_team_stats(row[7:-1], row[-1]),
+      })
+    return {
+      'season_id': season_id,
+      'season_name': season_name,
+      'divisions': list(divisions.values()),
     }
   
-  def get_team_games(self, team_ids: list[int], min_season: int):
+  def get_team_games(self, team_ids: list[int], min_season: int | None = None):
+    """Games of teams from a season on.
+
+    Args:
+      team_ids: Teams to list the games of.
+      min_season: Earliest season to include. Defaults to the current season
+        of each league shard, which number their seasons independently.
+    """
     games = []
     if not team_ids:
       return games
     team_ids = ",".join(map(str, team_ids))
-    self._cursor.execute(f"""
+    min_seasons = {
+        shard: min_season if min_season is not None
+        else self.get_current_season(shard) or 0
+        for shard in self._shards}
+
+    def select(schema, league, min_season):
+      return f"""
     SELECT DISTINCT
       g.id,
       g.start_dt,
@@ -275,32 +890,355 @@ class Database:
       g.home,
       g.home_id,
       g.away,
-      g.away_id
-    FROM Games as g
+      g.away_id,
+      {league if league is not None else "NULL"}
+    FROM {schema}.Games as g
       WHERE (
               g.home_id IN ({team_ids}) OR g.away_id IN ({team_ids})
-      ) AND g.season_id >= {min_season};""")
+      ) AND g.season_id >= {min_season}"""
+
+    # One SELECT per attached league shard, then one per archived season.
+    self._cursor.execute(" UNION ALL ".join(
+        select(schema, league, min_seasons[schema])
+        for schema, league in self._shards.items()))
+    rows = self._cursor.fetchall()
+    for shard in self._shards:
+      for schema, league in self._archive_schemas(
+          "id >= ?", (min_seasons[shard],), shards=[shard]):
+        self._cursor.execute(select(schema, league, min_seasons[shard]))
+        rows.extend(self._cursor.fetchall())
     games = []
-    keys = ['game_id',
-            'start_time',
-            'rink',
-            'level',
-            'home',
-            'home_id',
-            'away',
-            'away_id',
-            ]
-    for row in self._cursor.fetchall():
-      game = dict(zip(keys, row))
+    for row in rows:
+      game = dict(zip(GAME_KEYS, row))
+      if row[-1] is not None:
+        game['league'] = row[-1]
       games.append(game)
     return games
 
+  def get_games(self, game_ids: list[int]):
+    """Games by id, with scores."""
+    if not game_ids:
+      return []
+    game_ids = ",".join(map(str, game_ids))
+    self._cursor.execute(f"""
+    SELECT
+      g.id,
+      g.start_dt,
+      g.rink,
+      g.level,
+      g.home,
+      g.home_id,
+      g.away,
+      g.away_id,
+      json_extract(g.info, '$.home_goals'),
+      json_extract(g.info, '$.away_goals')
+    FROM Games as g
+      WHERE g.id IN ({game_ids});""")
+    keys = GAME_KEYS + ['home_goals', 'away_goals']
+    return [dict(zip(keys, row)) for row in self._cursor.fetchall()]
+
+  def get_team_schedule(self, team_ids: list[int], min_season: int):
+    """Games of teams with local start times and scores, in start order."""
+    if not team_ids:
+      return []
+    team_ids = ",".join(map(str, team_ids))
+    rows = []
+
+    def select(schema):
+      info = json_column(schema, "info")
+      self._cursor.execute(f"""
+      SELECT
+        id,
+        start_time,
+        rink,
+        level,
+        home,
+        home_id,
+        away,
+        away_id,
+        json_extract({info}, '$.home_goals'),
+        json_extract({info}, '$.away_goals')
+      FROM {schema}.Games
+        WHERE (home_id IN ({team_ids}) OR away_id IN ({team_ids}))
+          AND season_id >= ?
+        ORDER BY start_dt;""", (min_season,))
+      rows.extend(self._cursor.fetchall())
+
+    # Archived seasons all precede the live ones.
+    for schema, _ in self._archive_schemas(
+        "id >= ?", (min_season,), shards=["main"]):
+      select(schema)
+    select("main")
+    keys = ['game_id', 'start_time', 'rink', 'level', 'home', 'home_id',
+            'away', 'away_id', 'home_goals', 'away_goals']
+    return [dict(zip(keys, row)) for row in rows]
+
+  def get_game_results(self, season_ids: list[int] | None = None):
+    """Final scores of played games, optionally limited to some seasons.
+
+    Returns:
+      Rows of (season_id, home_id, away_id, home_goals, away_goals). Shootout
+      scores such as "4 S" are cast to their goal count.
+    """
+    where, seasons = "1", "1"
+    if season_ids is not None:
+      season_ids = ",".join(map(str, season_ids))
+      where = f"season_id IN ({season_ids})"
+      seasons = f"id IN ({season_ids})"
+    rows = []
+
+    def select(schema):
+      info = json_column(schema, "info")
+      self._cursor.execute(f"""
+      SELECT
+        season_id,
+        home_id,
+        away_id,
+        CAST(json_extract({info}, '$.home_goals') AS INTEGER),
+        CAST(json_extract({info}, '$.away_goals') AS INTEGER)
+      FROM {schema}.Games
+        WHERE home_id > 0 AND away_id > 0
+          AND json_extract({info}, '$.home_goals') GLOB '[0-9]*'
+          AND json_extract({info}, '$.away_goals') GLOB '[0-9]*'
+          AND {where};""")
+      rows.extend(self._cursor.fetchall())
+
+    for schema, _ in self._archive_schemas(seasons, shards=["main"]):
+      select(schema)
+    select("main")
+    return rows
+
+  def get_timeline_games(
+      self,
+      season_id: int | None = None,
+      game_ids: list[int] | None = None,
+      missing_only: bool = True,
+  ):
+    """Games with stats to build timelines of.
+
+    Returns:
+      Rows of (game_id, start_time, rink, stats).
+    """
+    where = ""
+    if season_id is not None:
+      where += " AND season_id = %d" % season_id
+    if game_ids is not None:
+      where += " AND id IN (%s)" % ",".join(map(str, game_ids))
+    if missing_only:
+      where += " AND id NOT IN (SELECT game_id FROM GameTimelines)"
+    self._cursor.execute(f"""
+    SELECT id, start_time, rink, stats
+    FROM Games
+      WHERE stats IS NOT NULL {where};""")
+    return self._cursor.fetchall()
+
+  def set_game_events(self, game_ids: list[int], rows: list[tuple[Any, ...]]):
+    """Replaces the timelines of games with rows of GameEvents."""
+    self._cursor.execute(
+        "DELETE FROM GameEvents WHERE game_id IN (%s)"
+        % ",".join(map(str, game_ids)))
+    self._cursor.executemany(
+        "INSERT INTO GameEvents VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    built_at = time.time()
+    self._cursor.executemany("""
+    INSERT OR REPLACE INTO GameTimelines (game_id, built_at)
+      VALUES (?, ?);""", [(game_id, built_at) for game_id in game_ids])
+    self._conn.commit()
+
+  def get_game_events(self, game_id: int):
+    """Timeline of a game, in estimated time order, untimed events last."""
+
+    def select(schema):
+      self._cursor.execute(f"""
+      SELECT kind, period, game_time, estimated_time, livebarn,
+        {json_column(schema, "event")}
+      FROM {schema}.GameEvents
+        WHERE game_id = ?
+        ORDER BY estimated_time IS NULL, estimated_time, kind, idx;""",
+          (game_id,))
+      return self._cursor.fetchall()
+
+    rows = select("main")
+    if not rows:
+      self._cursor.execute(
+          "SELECT season_id FROM ArchivedGames WHERE id = ?", (game_id,))
+      row = self._cursor.fetchone()
+      if row is not None:
+        rows = select(self._season_schema(row[0]))
+    events = []
+    for kind, period, game_time, estimated_time, livebarn, event in rows:
+      events.append(dict(
+          json.loads(event),
+          kind=kind,
+          period=period,
+          game_time=game_time,
+          estimated_time=estimated_time,
+          livebarn=livebarn))
+    return events
+
+  def get_latest_change(self) -> int:
+    """Sequence number of the most recent change, 0 if there are none."""
+    self._cursor.execute("SELECT MAX(seq) FROM Changes")
+    return self._cursor.fetchone()[0] or 0
+
+  def changes_pruned(self, after_seq: int) -> bool:
+    """Whether changes after a sequence number are missing from the log.
+
+    They are if they were pruned, or if after_seq is from a log that was
+    since replaced, e.g. by restoring the database.
+    """
+    self._cursor.execute("SELECT MIN(seq), MAX(seq) FROM Changes")
+    oldest, latest = self._cursor.fetchone()
+    if oldest is None:
+      return False
+    return oldest > after_seq + 1 or latest < after_seq
+
+  def get_changes(self, after_seq: int, limit: int = 10000):
+    """Changes logged after a sequence number, oldest first."""
+    self._cursor.execute("""
+    SELECT seq, kind, season_id, game_id, team_id
+    FROM Changes
+      WHERE seq > ?
+      ORDER BY seq
+      LIMIT ?;""", (after_seq, limit))
+    keys = ['seq', 'kind', 'season_id', 'game_id', 'team_id']
+    return [dict(zip(keys, row)) for row in self._cursor.fetchall()]
+
+  def get_changed_seasons(self, after_seq: int):
+    """Seasons with game changes after a sequence number.
+
+    Returns:
+      List of season ids, or None if changes after after_seq were pruned.
+    """
+    if self.changes_pruned(after_seq):
+      return None
+    self._cursor.execute("""
+    SELECT DISTINCT season_id FROM Changes
+      WHERE seq > ? AND kind = 'game';""", (after_seq,))
+    return [row[0] for row in self._cursor.fetchall()]
+
+  def get_changed_teams(self, after_seq: int):
+    """Teams with game changes after a sequence number.
+
+    Returns:
+      Set of team ids, or None if changes after after_seq were pruned.
+    """
+    if self.changes_pruned(after_seq):
+      return None
+    self._cursor.execute("""
+    SELECT DISTINCT team_id FROM Changes
+      WHERE seq > ? AND kind = 'game';""", (after_seq,))
+    return {row[0] for row in self._cursor.fetchall()}
+
+  def get_team_names(self, team_ids: list[int]) -> dict[int, str]:
+    if not team_ids:
+      return {}
+    team_ids = ",".join(map(str, team_ids))
+    self._cursor.execute(f"SELECT id, name FROM Teams WHERE id IN ({team_ids})")
+    return dict(self._cursor.fetchall())
+
+  def prune_changes(self, max_age: datetime.timedelta):
+    """Deletes changes older than max_age."""
+    self._cursor.execute(
+        "DELETE FROM Changes WHERE changed_at < strftime('%s', 'now') - ?",
+        (int(max_age.total_seconds()),))
+    self._conn.commit()
+
+  def get_archived_seasons(self) -> set[int]:
+    self._cursor.execute("SELECT id FROM Seasons WHERE archive IS NOT NULL")
+    return {row[0] for row in self._cursor.fetchall()}
+
+  def get_completed_seasons(self, keep: int = 1) -> list[int]:
+    """Live seasons other than the newest keep ones whose games are over.
+
+    Seasons synced without an end date end on their last stored game, and
+    seasons with neither are never complete.
+    """
+    self._cursor.execute("""
+    SELECT id FROM Seasons
+      WHERE archive IS NULL
+        AND id NOT IN (SELECT id FROM Seasons ORDER BY id DESC LIMIT ?)
+        AND COALESCE(end_date, (SELECT date(MAX(start_time)) FROM Games
+                                  WHERE season_id = Seasons.id))
+            < date('now')
+      ORDER BY id;""", (keep,))
+    return [row[0] for row in self._cursor.fetchall()]
+
+  def archive_season(self, season_id: int) -> str:
+    """Moves a completed season into a read-only archive.
+
+    The archive is a vacuumed database next to this one with the season's
+    rows of ARCHIVE_TABLES. The season's games, stats and timelines are then
+    deleted here and its Seasons row points to the archive, which queries of
+    the season attach from then on. Its game ids and team divisions stay
+    here in ArchivedGames and ArchivedTeamSeasons.
+
+    Returns:
+      Path of the archive.
+    """
+    if season_id in self.get_archived_seasons():
+      raise Exception("Season %d is already archived" % season_id)
+    path = archive_path(season_id, self._path)
+    building = path + ".tmp"
+    if os.path.exists(building):
+      os.remove(building)
+    self._cursor.execute("ATTACH DATABASE ? AS building", (building,))
+    try:
+      # Same tables and indexes, without the triggers.
+      self._cursor.execute("""
+      SELECT sql FROM main.sqlite_master
+        WHERE type IN ('table', 'index') AND sql IS NOT NULL
+          AND tbl_name IN (%s)
+        ORDER BY type DESC;""" % ",".join("'%s'" % t for t in ARCHIVE_TABLES))
+      for (sql,) in self._cursor.fetchall():
+        self._cursor.execute(re.sub(
+            r"^(CREATE (?:TABLE|INDEX) )", r"\1building.", sql))
+      for table, (where, json_columns) in ARCHIVE_TABLES.items():
+        self._cursor.execute("PRAGMA main.table_info(%s)" % table)
+        columns = [row[1] for row in self._cursor.fetchall()]
+        values = ", ".join(
+            f"deflate({c})" if c in json_columns else c for c in columns)
+        self._cursor.execute(f"""
+        INSERT INTO building.{table} ({", ".join(columns)})
+          SELECT {values} FROM main.{table} WHERE {where};""",
+            {"season": season_id})
+      self._conn.commit()
+    except Exception:
+      self._conn.rollback()
+      raise
+    finally:
+      self._cursor.execute("DETACH DATABASE building")
+    archive = sqlite3.connect(building)
+    archive.execute("VACUUM")
+    archive.close()
+    os.chmod(building, 0o444)
+    os.replace(building, path)
+
+    self._index_archived_season("main", season_id)
+    self._cursor.execute("""
+    DELETE FROM GameEvents
+      WHERE game_id IN (SELECT id FROM Games WHERE season_id = ?)""",
+        (season_id,))
+    self._cursor.execute("""
+    DELETE FROM GameTimelines
+      WHERE game_id IN (SELECT id FROM Games WHERE season_id = ?)""",
+        (season_id,))
+    self._cursor.execute(
+        "DELETE FROM Games WHERE season_id = ?", (season_id,))
+    self._cursor.execute(
+        "DELETE FROM TeamStats WHERE season_id = ?", (season_id,))
+    self._cursor.execute("UPDATE Seasons SET archive = ? WHERE id = ?",
+                         (os.path.basename(path), season_id))
+    self._conn.commit()
+    return path
+
   def get_team_stats(self, team_ids: list[int], season_id: int):
     if not team_ids:
       print('NO TEAMS??')
       return []
     team_ids = ",".join(map(str, team_ids))
     print(team_ids)
+    schema = self._season_schema(season_id)
     self._cursor.execute(f"""
     SELECT DISTINCT
       ts.team_id,
@@ -308,11 +1246,12 @@ class Database:
       s.name as season,
       s.id as season_id,
       d.name as level,
-      ts.stats
-    FROM TeamStats as ts
-      JOIN Seasons s ON s.id = ts.season_id
-      JOIN Teams t ON t.id = ts.team_id
-      JOIN Divisions d ON (d.id = ts.division_id AND d.conference_id = ts.conference_id)
+      {", ".join("ts." + c for c in STANDINGS_COLUMN_NAMES)},
+      {json_column(schema, "ts.stats")}
+    FROM {schema}.TeamStats as ts
+      JOIN {schema}.Seasons s ON s.id = ts.season_id
+      JOIN {schema}.Teams t ON t.id = ts.team_id
+      JOIN {schema}.Divisions d ON (d.id = ts.division_id AND d.conference_id = ts.conference_id)
       WHERE ts.team_id IN ({team_ids}) AND ts.season_id = {season_id};""")
     teams = []
     keys = ['team_id',
@@ -320,14 +1259,178 @@ class Database:
             'season',
             'season_id',
             'level',
-            'stats',
             ]
     for row in self._cursor.fetchall():
       team = dict(zip(keys, row))
-      team['stats'] = json.loads(team['stats'])
+      team['stats'] = join_team_stats(row[len(keys):-1], row[-1])
       teams.append(team)
     return teams
 
+  def get_sync_runs(self, limit: int = 10):
+    """Most recent sync runs with totals and their per-season metrics."""
+    self._cursor.execute("""
+    SELECT
+      run_id,
+      MIN(started_at),
+      MAX(started_at + fetch_seconds + parse_seconds + write_seconds),
+      SUM(fetch_seconds),
+      SUM(parse_seconds),
+      SUM(write_seconds),
+      SUM(pages),
+      SUM(bytes),
+      SUM(rows),
+      SUM(error IS NOT NULL)
+    FROM SyncRuns
+      GROUP BY run_id
+      ORDER BY run_id DESC
+      LIMIT ?;""", (limit,))
+    keys = ['run_id', 'started_at', 'finished_at', 'fetch_seconds',
+            'parse_seconds', 'write_seconds', 'pages', 'bytes', 'rows',
+            'errors']
+    runs = {}
+    for row in self._cursor.fetchall():
+      run = dict(zip(keys, row))
+      run['seconds'] = run['finished_at'] - run['started_at']
+      run['rows_per_second'] = (
+          run['rows'] / run['seconds'] if run['seconds'] else None)
+      run['seasons'] = []
+      runs[run['run_id']] = run
+    if not runs:
+      return []
+    self._cursor.execute(f"""
+    SELECT
+      run_id,
+      season_id,
+      kind,
+      started_at,
+      fetch_seconds,
+      parse_seconds,
+      write_seconds,
+      pages,
+      bytes,
+      rows,
+      error
+    FROM SyncRuns
+      WHERE run_id IN ({",".join(map(str, runs))})
+      ORDER BY run_id, season_id, kind;""")
+    keys = ['season_id', 'kind', 'started_at', 'fetch_seconds',
+            'parse_seconds', 'write_seconds', 'pages', 'bytes', 'rows',
+            'error']
+    for row in self._cursor.fetchall():
+      runs[row[0]]['seasons'].append(dict(zip(keys, row[1:])))
+    return list(runs.values())
+
+  def get_last_synced(self, kind: str = "games"):
+    """Finish time of the last error free sync of the current season."""
+    self._cursor.execute("""
+    SELECT MAX(started_at + fetch_seconds + parse_seconds + write_seconds)
+    FROM SyncRuns
+      WHERE kind = ? AND error IS NULL
+        AND season_id = (SELECT MAX(id) FROM Seasons);""", (kind,))
+    return self._cursor.fetchone()[0]
+
+  def optimize_search(self):
+    """Merges the TeamSearch index, which the Teams triggers fragment."""
+    self._cursor.execute(
+        "INSERT INTO TeamSearch (TeamSearch) VALUES ('optimize')")
+    self._conn.commit()
+
+  def search_teams(self, query: str, limit: int = 10):
+    """Ranked prefix search of team names.
+
+    Every word in the query must prefix a word of the team name. Of the
+    SEARCH_CANDIDATES matching teams with the most recent seasons, the
+    shortest names rank first, then the most recent season. That is the bm25
+    order for names matching every word once, without bm25's pass over every
+    match to weigh the words, which is slow for short prefixes.
+    Archived seasons of the matched teams come from ArchivedTeamSeasons, so
+    no archive is attached.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+      return []
+    match = " ".join('"%s"*' % w for w in words)
+    teams = {}
+    ranks = {}
+    # Search every attached league shard, then merge by rank.
+    for schema, league in self._shards.items():
+      self._cursor.execute(f"""
+      WITH candidates AS (
+        SELECT
+          f.rowid & {TEAM_ID_MASK} AS team_id,
+          length(f.name) AS rank,
+          f.rowid >> 32 AS latest
+        FROM {schema}.TeamSearch AS f
+        WHERE f.name MATCH :match
+        ORDER BY f.rowid DESC
+        LIMIT :candidates
+      ), m AS (
+        SELECT * FROM candidates
+        ORDER BY rank, latest DESC, team_id
+        LIMIT :limit
+      )
+      SELECT
+        m.team_id,
+        t.name,
+        ts.season_id,
+        s.name as season,
+        ts.division_id,
+        ts.conference_id,
+        d.name as level,
+        m.rank,
+        m.latest
+      FROM m
+        JOIN {schema}.Teams t ON t.id = m.team_id
+        LEFT JOIN {schema}.TeamStats ts ON ts.team_id = m.team_id
+        LEFT JOIN {schema}.Seasons s ON s.id = ts.season_id
+        LEFT JOIN {schema}.Divisions d ON (d.id = ts.division_id AND d.conference_id = ts.conference_id)
+        ORDER BY m.rank, m.latest DESC, m.team_id, ts.season_id DESC;""",
+          {"match": match, "limit": limit,
+           "candidates": max(limit, SEARCH_CANDIDATES)})
+      for row in self._cursor.fetchall():
+        key = (league, row[0])
+        if key not in teams:
+          teams[key] = {
+            'team_id': row[0],
+            'name': row[1],
+            'seasons': [],
+          }
+          if league is not None:
+            teams[key]['league'] = league
+          ranks[key] = (row[7], -(row[8] or 0))
+        if row[2] is not None:
+          teams[key]['seasons'].append({
+            'season_id': row[2],
+            'season': row[3],
+            'division_id': row[4],
+            'conference_id': row[5],
+            'level': row[6],
+          })
+      team_ids = ",".join(str(t) for l, t in teams if l == league)
+      if not team_ids:
+        continue
+      self._cursor.execute(f"""
+      SELECT
+        a.team_id,
+        a.season_id,
+        s.name as season,
+        a.division_id,
+        a.conference_id,
+        d.name as level
+      FROM {schema}.ArchivedTeamSeasons a
+        JOIN {schema}.Seasons s ON s.id = a.season_id
+        JOIN {schema}.Divisions d ON (d.id = a.division_id AND d.conference_id = a.conference_id)
+        WHERE a.team_id IN ({team_ids});""")
+      for row in self._cursor.fetchall():
+        key = (league, row[0])
+        teams[key]['seasons'].append(dict(zip(
+            ['season_id', 'season', 'division_id', 'conference_id', 'level'],
+            row[1:])))
+        ranks[key] = (ranks[key][0], min(ranks[key][1], -row[1]))
+    for team in teams.values():
+      team['seasons'].sort(key=lambda season: -season['season_id'])
+    return [teams[key] for key in sorted(teams, key=ranks.get)[:limit]]
+
   # Helpers
   def ex(self, s: str):
     self._cursor.execute(s)
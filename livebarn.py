@@ -1,4 +1,13 @@
+import argparse
 import datetime
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import database
 
 LIVEBARN_RINKS = {
     'San Jose South': 547,
@@ -57,3 +66,168 @@ def get_livebarn_url(date: datetime.datetime, rink: str):
     date -= datetime.timedelta(minutes=date.minute % 30)
   date = datetime.datetime.strftime(date, '%Y-%m-%dT%H:%M')
   return LIVEBARN_URL.format(date=date, sid=sid)
+
+
+# Timeline of a game's goals and penalties with their estimated wall clock
+# times and LiveBarn links, computed for many games at once and stored in
+# GameEvents (see Database.create_tables).
+
+# Event kind to the stats key of its list and the key of its period clock.
+EVENT_KINDS = {
+    'goal': ('goals', 'time'),
+    'penalty': ('penalties', 'off_ice_time'),
+}
+
+
+class Calibration(NamedTuple):
+  warmup_minutes: float = 5
+  period_minutes: float = 22
+
+
+DEFAULT_CALIBRATION = Calibration()
+# Rink (as stored in Games, e.g. 'North') to its Calibration.
+RINK_CALIBRATION: dict[str, Calibration] = {}
+
+
+def set_calibration(rink: str, warmup_minutes: float, period_minutes: float):
+  RINK_CALIBRATION[rink] = Calibration(warmup_minutes, period_minutes)
+
+
+def load_calibration(path: str):
+  """Loads rink calibrations from a JSON file.
+
+  The file maps rinks to their calibration, e.g.
+  {"North": {"warmup_minutes": 4, "period_minutes": 20}}.
+  """
+  with open(path) as f:
+    for rink, calibration in json.load(f).items():
+      RINK_CALIBRATION[rink] = DEFAULT_CALIBRATION._replace(**calibration)
+
+
+def get_calibration(rink: str) -> Calibration:
+  return RINK_CALIBRATION.get(rink, DEFAULT_CALIBRATION)
+
+
+def get_livebarn_sid(rink: str) -> int | None:
+  """LiveBarn surface id of a rink, with or without the 'San Jose ' prefix."""
+  return LIVEBARN_RINKS.get(rink, LIVEBARN_RINKS.get('San Jose ' + rink))
+
+
+def flatten_events(games: list[tuple[int, str, str, str]]) -> pd.DataFrame:
+  """Flattens the goals and penalties of games into one frame.
+
+  Args:
+    games: Rows of (game_id, start_time, rink, stats JSON).
+  """
+  records = []
+  for game_id, start_time, rink, stats in games:
+    stats = json.loads(stats)
+    for kind, (key, clock_key) in EVENT_KINDS.items():
+      for idx, event in enumerate(stats.get(key) or []):
+        records.append((game_id, kind, idx, start_time, rink,
+                        event.get('period'), event.get(clock_key), event))
+  return pd.DataFrame.from_records(records, columns=[
+      'game_id', 'kind', 'idx', 'start_time', 'rink', 'period', 'game_time',
+      'event'])
+
+
+def estimate_times(events: pd.DataFrame) -> pd.DataFrame:
+  """Adds estimated_time and livebarn columns to a frame of flattened events.
+
+  Same estimate as _estimate_time and get_livebarn_url, as column operations.
+  Events with an unknown period or clock get no time, and events at rinks
+  without a camera no link.
+  """
+  clock = events['game_time'].astype(str).str.split(':', n=1, expand=True)
+  clock = clock.reindex(columns=[0, 1])
+  has_minutes = clock[1].notna()
+  minutes = pd.to_numeric(clock[0].where(has_minutes), errors='coerce')
+  seconds = pd.to_numeric(clock[1].where(has_minutes, clock[0]),
+                          errors='coerce')
+  remaining = np.trunc(minutes.fillna(0) * 60 + seconds)
+  period = pd.to_numeric(events['period'], errors='coerce')
+
+  rinks = events['rink'].unique()
+  calibrations = {rink: get_calibration(rink) for rink in rinks}
+  warmup = events['rink'].map(
+      {rink: c.warmup_minutes for rink, c in calibrations.items()})
+  period_minutes = events['rink'].map(
+      {rink: c.period_minutes for rink, c in calibrations.items()})
+  offset = (warmup + period_minutes * period) * 60 - remaining
+  estimated = (pd.to_datetime(events['start_time'])
+               + pd.to_timedelta(offset, unit='s'))
+
+  sids = events['rink'].map({rink: get_livebarn_sid(rink) for rink in rinks})
+  # LIVEBARN_URL ends with its sid.
+  date_prefix, sid_prefix = LIVEBARN_URL.replace('{sid}', '').split('{date}')
+  links = (date_prefix
+           + estimated.dt.floor('30min').dt.strftime('%Y-%m-%dT%H:%M')
+           + sid_prefix + sids.astype('Int64').astype(str))
+  events = events.copy()
+  events['estimated_time'] = estimated.dt.strftime('%Y-%m-%dT%H:%M:%S')
+  events['livebarn'] = links.where(estimated.notna() & sids.notna())
+  events['estimated_time'] = events['estimated_time'].where(estimated.notna())
+  return events
+
+
+def build_timelines(
+    db: database.Database,
+    season_id: int | None = None,
+    game_ids: list[int] | None = None,
+    rebuild: bool = False,
+) -> int:
+  """Computes and stores the timelines of games with stats.
+
+  Args:
+    db: Database to read games from and write GameEvents to.
+    season_id: Only build games of this season.
+    game_ids: Only build these games.
+    rebuild: Also rebuild stored timelines, e.g. after a calibration change.
+      Otherwise only games without one are built.
+
+  Returns:
+    The number of games built.
+  """
+  games = db.get_timeline_games(
+      season_id=season_id, game_ids=game_ids, missing_only=not rebuild)
+  if not games:
+    return 0
+  events = flatten_events(games)
+  rows = []
+  if not events.empty:
+    events = estimate_times(events)
+    events = events.astype(object).where(events.notna(), None)
+    rows = [
+        (e.game_id, e.kind, e.idx,
+         None if e.period is None else str(e.period),
+         None if e.game_time is None else str(e.game_time),
+         e.estimated_time, e.livebarn, json.dumps(e.event))
+        for e in events.itertuples(index=False)
+    ]
+  db.set_game_events([g[0] for g in games], rows)
+  return len(games)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description='Builds the timelines of games with stats.')
+  parser.add_argument('--season_id', type=int, default=None)
+  parser.add_argument('--rebuild', action='store_true',
+                      help='Also rebuild stored timelines, e.g. after '
+                      'recalibrating.')
+  parser.add_argument('--calibration',
+                      default=os.environ.get('LIVEBARN_CALIBRATION'),
+                      help='JSON file of rink calibrations.')
+  parser.add_argument('--db', default=database.DATABASE_PATH)
+  args = parser.parse_args()
+
+  if args.calibration:
+    load_calibration(args.calibration)
+  db = database.Database(args.db)
+  db.create_tables()
+  print('Built timelines of %d games' % build_timelines(
+      db, season_id=args.season_id, rebuild=args.rebuild))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,347 @@
+"""Load-testing harness for the Flask API.
+
+Builds a synthetic league database at a configurable scale, drives the API
+endpoints with a realistic mix of team ids at a fixed concurrency and reports
+throughput and p50/p95/p99 latency per endpoint.
+
+Against an in-process threaded server (default):
+
+  python loadtest.py --seasons 10 --teams 300 --games 20 --concurrency 16
+
+Against a running uWSGI worker, started on the same synthetic database:
+
+  python loadtest.py --build_only --db /tmp/loadtest.db
+  HOCKEY_LEAGUE_DB=/tmp/loadtest.db uwsgi --http :5000 --wsgi-file app.py \\
+      --callable app --processes 1
+  python loadtest.py --db /tmp/loadtest.db --url http://localhost:5000
+
+Pass --with_writer to run a writer simulating Syncer against the same
+database for the duration of the test.
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import requests
+
+import database
+
+DIVISION_SIZE = 8
+# /api/divisions serves season 66, so synthetic seasons end there.
+LAST_SEASON = 66
+
+# Relative weight of each endpoint in the request mix.
+ENDPOINT_MIX = {
+    'games': 0.7,
+    'teams': 0.25,
+    'divisions': 0.05,
+}
+
+
+def _team_stats(rng: random.Random, place: int):
+  wins, losses, ties = rng.randint(0, 10), rng.randint(0, 10), rng.randint(0, 2)
+  return {
+      'gamesPlayed': wins + losses + ties,
+      'wins': wins,
+      'ties': ties,
+      'losses': losses,
+      'overtimeLosses': 0,
+      'points': wins * 2 + ties,
+      'streak': '',
+      'tieBreaker': '',
+      'place': place,
+  }
+
+
+def build_synthetic_db(
+    path: str,
+    seasons: int,
+    teams_per_season: int,
+    games_per_team: int,
+    seed: int = 0,
+):
+  """Creates a synthetic league database.
+
+  Every season has its own team ids, split into divisions of DIVISION_SIZE,
+  and every team plays about games_per_team games against division rivals.
+
+  Returns:
+    The team ids of the most recent season.
+  """
+  rng = random.Random(seed)
+  if os.path.exists(path):
+    os.remove(path)
+  db = database.Database(path)
+  db.create_tables()
+  conn = db._conn  # pylint: disable=protected-access
+  divisions = max(1, teams_per_season // DIVISION_SIZE)
+  conn.executemany(
+      'INSERT INTO Divisions (id, conference_id, name) VALUES (?, ?, ?)',
+      [(d, 0, 'Adult Division %d' % d) for d in range(divisions)])
+  game_id = 0
+  team_ids = []
+  start = datetime.datetime(2020, 9, 1, 18)
+  for s in range(seasons):
+    season_id = LAST_SEASON - seasons + 1 + s
+    conn.execute('INSERT INTO Seasons (id, name) VALUES (?, ?)',
+                 (season_id, 'Season %d' % season_id))
+    team_ids = [season_id * 10000 + t for t in range(teams_per_season)]
+    conn.executemany(
+        'INSERT INTO Teams (id, name) VALUES (?, ?)',
+        [(t, 'Team %d' % t) for t in team_ids])
+    stats = []
+    games = []
+    for t, team_id in enumerate(team_ids):
+      division_id = min(t // DIVISION_SIZE, divisions - 1)
+      values, extra = database.split_team_stats(
+          _team_stats(rng, t % DIVISION_SIZE + 1))
+      stats.append((season_id, division_id, 0, team_id, *values, extra))
+      rivals = [r for r in team_ids[division_id * DIVISION_SIZE:
+                                    (division_id + 1) * DIVISION_SIZE]
+                if r != team_id] or team_ids
+      # Each game has two teams, so schedule half of them from each side.
+      for _ in range(games_per_team // 2):
+        game_id += 1
+        away_id = rng.choice(rivals)
+        start_dt = start + datetime.timedelta(
+            days=s * 120 + rng.randint(0, 119), minutes=rng.randint(0, 300))
+        games.append((
+            game_id, season_id, 'Div %d' % division_id,
+            start_dt.isoformat(), start_dt.timestamp() * 1000,
+            rng.choice(['North', 'South', 'East', 'Center']),
+            'Team %d' % team_id, team_id, 'Team %d' % away_id, away_id,
+            json.dumps({'home_goals': str(rng.randint(0, 8)),
+                        'away_goals': str(rng.randint(0, 8)),
+                        'type': 'Regular'})))
+    conn.executemany(
+        'INSERT INTO TeamStats (season_id, division_id, conference_id,'
+        ' team_id, %s, stats) VALUES (?, ?, ?, ?, %s, ?)' % (
+            ', '.join(database.STANDINGS_COLUMN_NAMES),
+            ', '.join('?' * len(database.STANDINGS_COLUMNS))), stats)
+    conn.executemany(
+        'INSERT INTO Games (id, season_id, level, start_time, start_dt, rink,'
+        ' home, home_id, away, away_id, info)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', games)
+  conn.commit()
+  db.close()
+  return team_ids
+
+
+def sample_team_ids(rng: random.Random, team_ids: list[int]):
+  """Picks 1-4 team ids, skewed towards a small set of popular teams."""
+  count = rng.choice([1, 1, 1, 2, 2, 3, 4])
+  # Pareto-distributed ranks make a few teams account for most requests.
+  return sorted({
+      team_ids[min(int(rng.paretovariate(1.2)) - 1, len(team_ids) - 1)]
+      for _ in range(count)})
+
+
+class Results:
+  """Thread-safe latency collection per endpoint."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.latencies = collections.defaultdict(list)
+    self.errors = collections.defaultdict(int)
+
+  def add(self, endpoint: str, seconds: float, ok: bool):
+    with self._lock:
+      self.latencies[endpoint].append(seconds)
+      if not ok:
+        self.errors[endpoint] += 1
+
+
+def percentile(sorted_values: list[float], pct: float):
+  index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+  return sorted_values[index]
+
+
+def client(
+    url: str,
+    team_ids: list[int],
+    results: Results,
+    deadline: float,
+    seed: int,
+):
+  """Issues requests back to back until the deadline."""
+  rng = random.Random(seed)
+  session = requests.Session()
+  endpoints = list(ENDPOINT_MIX)
+  weights = list(ENDPOINT_MIX.values())
+  while time.monotonic() < deadline:
+    endpoint = rng.choices(endpoints, weights)[0]
+    params = {}
+    if endpoint != 'divisions':
+      params['team_ids'] = ','.join(map(str, sample_team_ids(rng, team_ids)))
+    start = time.perf_counter()
+    try:
+      response = session.get('%s/api/%s' % (url, endpoint), params=params)
+      ok = response.status_code == 200 and 'error' not in response.json()
+    except requests.RequestException:
+      ok = False
+    results.add(endpoint, time.perf_counter() - start, ok)
+
+
+def writer(
+    path: str,
+    team_ids: list[int],
+    stop: threading.Event,
+    rows_per_second: float,
+    written: list[int],
+):
+  """Simulates Syncer re-writing the current season, one commit per row."""
+  rng = random.Random(1)
+  db = database.Database(path)
+  season_id = db.get_current_season()
+  games = db.get_team_games(team_ids=team_ids, min_season=season_id)
+  divisions = max(1, len(team_ids) // DIVISION_SIZE)
+  delay = 1.0 / rows_per_second if rows_per_second else 0
+  while not stop.is_set():
+    game = rng.choice(games)
+    db.add_game(
+        game_id=game['game_id'],
+        season_id=season_id,
+        level=game['level'],
+        start_dt=datetime.datetime.fromtimestamp(game['start_time'] / 1000),
+        rink=game['rink'],
+        home=game['home'],
+        home_id=game['home_id'],
+        away=game['away'],
+        away_id=game['away_id'],
+        home_goals=str(rng.randint(0, 8)),
+        away_goals=str(rng.randint(0, 8)),
+        type='Regular',
+    )
+    team_index = rng.randrange(len(team_ids))
+    db.set_team_stats(
+        season_id=season_id,
+        division_id=min(team_index // DIVISION_SIZE, divisions - 1),
+        conference_id=0,
+        team_id=team_ids[team_index],
+        stats=_team_stats(rng, 1),
+    )
+    written[0] += 2
+    if delay:
+      time.sleep(delay)
+  db.close()
+
+
+def start_local_server(path: str):
+  """Serves app.py from a background thread, returns its base url."""
+  from werkzeug import serving  # pylint: disable=g-import-not-at-top
+  import app  # pylint: disable=g-import-not-at-top
+
+  class QuietHandler(serving.WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+      pass
+
+  app.app.config['DATABASE'] = path
+  server = serving.make_server(
+      '127.0.0.1', 0, app.app, threaded=True, request_handler=QuietHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return 'http://127.0.0.1:%d' % server.server_port
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--db', default=os.path.join(
+      tempfile.gettempdir(), 'loadtest_hockey_league.db'))
+  parser.add_argument('--seasons', type=int, default=5)
+  parser.add_argument('--teams', type=int, default=200,
+                      help='Teams per season.')
+  parser.add_argument('--games', type=int, default=20,
+                      help='Games per team per season.')
+  parser.add_argument('--reuse_db', action='store_true',
+                      help='Use an existing database at --db as is.')
+  parser.add_argument('--build_only', action='store_true')
+  parser.add_argument('--url', default=None,
+                      help='Base url of a running server. Defaults to an'
+                      ' in-process server.')
+  parser.add_argument('--concurrency', type=int, default=8)
+  parser.add_argument('--duration', type=float, default=30,
+                      help='Seconds to run the load for.')
+  parser.add_argument('--with_writer', action='store_true',
+                      help='Run a writer simulating Syncer concurrently.')
+  parser.add_argument('--writer_rate', type=float, default=50,
+                      help='Writer rows per second, 0 for unthrottled.')
+  args = parser.parse_args()
+
+  if args.reuse_db:
+    db = database.Database(args.db)
+    season_id = db.get_current_season()
+    team_ids = [r[0] for r in db.ex(
+        'SELECT team_id FROM TeamStats WHERE season_id = %d' % season_id)]
+    db.close()
+  else:
+    start = time.perf_counter()
+    team_ids = build_synthetic_db(
+        args.db, args.seasons, args.teams, args.games)
+    print('Built %s (%.1f MB) in %.1f s' % (
+        args.db, os.path.getsize(args.db) / 1e6, time.perf_counter() - start))
+  if args.build_only:
+    return
+
+  url = args.url or start_local_server(args.db)
+  results = Results()
+  stop = threading.Event()
+  written = [0]
+  writer_thread = None
+  if args.with_writer:
+    writer_thread = threading.Thread(
+        target=writer,
+        args=(args.db, team_ids, stop, args.writer_rate, written))
+    writer_thread.start()
+
+  deadline = time.monotonic() + args.duration
+  clients = [
+      threading.Thread(
+          target=client, args=(url, team_ids, results, deadline, i))
+      for i in range(args.concurrency)
+  ]
+  start = time.perf_counter()
+  for thread in clients:
+    thread.start()
+  for thread in clients:
+    thread.join()
+  elapsed = time.perf_counter() - start
+  stop.set()
+  if writer_thread:
+    writer_thread.join()
+
+  print('%d clients for %.1f s against %s' % (args.concurrency, elapsed, url))
+  print('%-10s %8s %8s %7s %8s %8s %8s %8s' % (
+      'endpoint', 'requests', 'req/s', 'errors', 'mean ms', 'p50 ms',
+      'p95 ms', 'p99 ms'))
+  all_latencies = []
+  for endpoint, latencies in sorted(results.latencies.items()):
+    all_latencies.extend(latencies)
+    latencies.sort()
+    print('%-10s %8d %8.1f %7d %8.1f %8.1f %8.1f %8.1f' % (
+        endpoint, len(latencies), len(latencies) / elapsed,
+        results.errors[endpoint], statistics.mean(latencies) * 1000,
+        percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+        percentile(latencies, 99) * 1000))
+  if all_latencies:
+    all_latencies.sort()
+    print('%-10s %8d %8.1f %7d %8.1f %8.1f %8.1f %8.1f' % (
+        'total', len(all_latencies), len(all_latencies) / elapsed,
+        sum(results.errors.values()), statistics.mean(all_latencies) * 1000,
+        percentile(all_latencies, 50) * 1000,
+        percentile(all_latencies, 95) * 1000,
+        percentile(all_latencies, 99) * 1000))
+  if args.with_writer:
+    print('writer     %8d rows  %8.1f rows/s' % (
+        written[0], written[0] / elapsed))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,256 @@
+"""Precomputed head-to-head records between teams.
+
+Results are kept as dense team x team arrays per season, so a pairwise record
+is a single array lookup. Across all seasons most teams never met, so the
+all-time records are the sums of the season results of the pairs that played,
+stored sparsely. After a sync only the seasons with changed games (from the
+Changes log) are rebuilt, and the all-time records are summed again from the
+season matrices.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+import database
+
+REFRESH_INTERVAL = 30.0
+# Pairs are keyed by team_id << 32 | opponent_id.
+PAIR_SHIFT = 32
+OPPONENT_MASK = (1 << PAIR_SHIFT) - 1
+
+
+def _record(
+    team_id: int,
+    opponent_id: int,
+    wins: int,
+    losses: int,
+    ties: int,
+    goals_for: int,
+    goals_against: int,
+):
+  return {
+      'team_id': int(team_id),
+      'opponent_id': int(opponent_id),
+      'games': int(wins + losses + ties),
+      'wins': int(wins),
+      'losses': int(losses),
+      'ties': int(ties),
+      'goals_for': int(goals_for),
+      'goals_against': int(goals_against),
+      'goal_diff': int(goals_for - goals_against),
+  }
+
+
+class MatchupMatrix:
+  """Team x team results.
+
+  wins[i, j] and ties[i, j] count the games team_ids[i] won and tied against
+  team_ids[j], goals[i, j] the goals it scored against it. Losses and goal
+  differential are derived from the transposes.
+  """
+
+  def __init__(
+      self,
+      team_ids: np.ndarray,
+      wins: np.ndarray,
+      ties: np.ndarray,
+      goals: np.ndarray,
+  ):
+    self.team_ids = team_ids
+    self.wins = wins
+    self.ties = ties
+    self.goals = goals
+    self._index = {int(t): i for i, t in enumerate(team_ids)}
+
+  @classmethod
+  def empty(cls, team_ids: np.ndarray):
+    n = len(team_ids)
+    return cls(team_ids, *(np.zeros((n, n), dtype=np.int16) for _ in range(3)))
+
+  @classmethod
+  def from_results(cls, results: np.ndarray):
+    """Builds a matrix from an array of (home, away, home_goals, away_goals)."""
+    team_ids = np.unique(results[:, :2])
+    matrix = cls.empty(team_ids)
+    home = np.searchsorted(team_ids, results[:, 0])
+    away = np.searchsorted(team_ids, results[:, 1])
+    home_goals = results[:, 2].astype(np.int16)
+    away_goals = results[:, 3].astype(np.int16)
+    home_won = home_goals > away_goals
+    away_won = home_goals < away_goals
+    tied = home_goals == away_goals
+    np.add.at(matrix.wins, (home[home_won], away[home_won]), 1)
+    np.add.at(matrix.wins, (away[away_won], home[away_won]), 1)
+    np.add.at(matrix.ties, (home[tied], away[tied]), 1)
+    np.add.at(matrix.ties, (away[tied], home[tied]), 1)
+    np.add.at(matrix.goals, (home, away), home_goals)
+    np.add.at(matrix.goals, (away, home), away_goals)
+    return matrix
+
+  def pairs(self):
+    """Results of the pairs that played, in the layout of PairRecords.
+
+    Returns:
+      Tuple of (pair keys, array of wins, ties and goals per pair).
+    """
+    games = self.wins + self.wins.T + self.ties
+    i, j = np.nonzero(games)
+    keys = self.team_ids[i] << PAIR_SHIFT | self.team_ids[j]
+    values = np.stack(
+        [self.wins[i, j], self.ties[i, j], self.goals[i, j]], axis=1)
+    return keys, values.astype(np.int64)
+
+  def __contains__(self, team_id: int):
+    return team_id in self._index
+
+  def _record(self, i: int, j: int):
+    return _record(
+        self.team_ids[i], self.team_ids[j], self.wins[i, j], self.wins[j, i],
+        self.ties[i, j], self.goals[i, j], self.goals[j, i])
+
+  def pair(self, team_id: int, opponent_id: int):
+    """Record of team_id against opponent_id, None if either never played."""
+    if team_id not in self._index or opponent_id not in self._index:
+      return None
+    return self._record(self._index[team_id], self._index[opponent_id])
+
+  def opponents(self, team_id: int):
+    """Records of team_id against every team it played."""
+    if team_id not in self._index:
+      return []
+    i = self._index[team_id]
+    games = self.wins[i] + self.wins[:, i] + self.ties[i]
+    return [self._record(i, j) for j in np.flatnonzero(games)]
+
+
+class PairRecords:
+  """Results of the team pairs that played, for any number of teams.
+
+  Holds what MatchupMatrix does, but only for the (team, opponent) pairs that
+  played, sorted by their keys. Memory grows with the pairs instead of the
+  square of the teams.
+  """
+
+  def __init__(self, keys: np.ndarray, values: np.ndarray):
+    self.keys = keys
+    # Columns of wins, ties and goals of the team against the opponent.
+    self.values = values
+    self.team_ids = np.unique(keys >> PAIR_SHIFT)
+
+  @classmethod
+  def from_matrices(cls, matrices: list[MatchupMatrix]):
+    """Sums the results of the matrices."""
+    pairs = [m.pairs() for m in matrices]
+    keys = np.concatenate([k for k, _ in pairs] + [np.zeros(0, np.int64)])
+    values = np.concatenate(
+        [v for _, v in pairs] + [np.zeros((0, 3), np.int64)])
+    if not len(keys):
+      return cls(keys, values)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return cls(keys[starts], np.add.reduceat(values[order], starts, axis=0))
+
+  def __contains__(self, team_id: int):
+    i = np.searchsorted(self.team_ids, team_id)
+    return i < len(self.team_ids) and self.team_ids[i] == team_id
+
+  def _values(self, team_id: int, opponent_id: int):
+    key = team_id << PAIR_SHIFT | opponent_id
+    i = np.searchsorted(self.keys, key)
+    if i < len(self.keys) and self.keys[i] == key:
+      return self.values[i]
+    return np.zeros(3, np.int64)
+
+  def pair(self, team_id: int, opponent_id: int):
+    """Record of team_id against opponent_id, None if either never played."""
+    if team_id not in self or opponent_id not in self:
+      return None
+    wins, ties, goals_for = self._values(team_id, opponent_id)
+    losses, _, goals_against = self._values(opponent_id, team_id)
+    return _record(
+        team_id, opponent_id, wins, losses, ties, goals_for, goals_against)
+
+  def opponents(self, team_id: int):
+    """Records of team_id against every team it played."""
+    start, end = np.searchsorted(
+        self.keys, [team_id << PAIR_SHIFT, (team_id + 1) << PAIR_SHIFT])
+    return [self.pair(team_id, int(key & OPPONENT_MASK))
+            for key in self.keys[start:end]]
+
+
+def _season_matrices(rows: list[tuple[int, ...]]):
+  """Groups get_game_results rows into a matrix per season."""
+  results = np.array(rows, dtype=np.int64).reshape(-1, 5)
+  matrices = {}
+  for season_id in np.unique(results[:, 0]):
+    season_results = results[results[:, 0] == season_id, 1:]
+    matrices[int(season_id)] = MatchupMatrix.from_results(season_results)
+  return matrices
+
+
+class MatchupEngine:
+  """Season and all-time matchup matrices of a database, kept up to date."""
+
+  def __init__(self, db_path: str, refresh_interval: float = REFRESH_INTERVAL):
+    self._db_path = db_path
+    self._refresh_interval = refresh_interval
+    self._lock = threading.Lock()
+    self._seasons = {}
+    self._all_time = PairRecords.from_matrices([])
+    self._seq = None
+    self._refreshed = 0.0
+
+  def _rebuild(self, db: database.Database):
+    self._seq = db.get_latest_change()
+    seasons = _season_matrices(db.get_game_results())
+    all_time = PairRecords.from_matrices(list(seasons.values()))
+    self._seasons = seasons
+    self._all_time = all_time
+
+  def _update(self, db: database.Database):
+    seq = db.get_latest_change()
+    season_ids = db.get_changed_seasons(self._seq)
+    if season_ids is None:
+      # Changes we have not seen were pruned.
+      self._rebuild(db)
+      return
+    self._seq = seq
+    if not season_ids:
+      return
+    updated = _season_matrices(db.get_game_results(season_ids))
+    # Readers may hold the current matrices, so build new ones and swap.
+    seasons = dict(self._seasons)
+    for season_id in season_ids:
+      seasons.pop(season_id, None)
+      if season_id in updated:
+        seasons[season_id] = updated[season_id]
+    all_time = PairRecords.from_matrices(list(seasons.values()))
+    self._seasons = seasons
+    self._all_time = all_time
+
+  def refresh(self, force: bool = False):
+    """Applies synced changes, at most once per refresh interval."""
+    with self._lock:
+      if not force and time.monotonic() - self._refreshed < self._refresh_interval:
+        return
+      db = database.Database(self._db_path)
+      try:
+        if self._seq is None:
+          self._rebuild(db)
+        else:
+          self._update(db)
+      finally:
+        db.close()
+      self._refreshed = time.monotonic()
+
+  def matrix(
+      self, season_id: int | None = None
+  ) -> MatchupMatrix | PairRecords | None:
+    """Matrix of a season, or the all-time records if season_id is None."""
+    self.refresh()
+    if season_id is None:
+      return self._all_time
+    return self._seasons.get(season_id)
@@ -0,0 +1,314 @@
+"""Pipelined season backfill that overlaps fetching, parsing and writing.
+
+Syncer fetches, parses and writes one page at a time in one thread. For large
+backfills the pipeline instead runs three stages connected by bounded queues:
+
+  fetch:  a pool of threads downloads raw page bytes (network bound). On
+          the first sync of a season that includes the scoresheet of its
+          first game, which dates the season, once its schedule is parsed.
+  parse:  a ProcessPoolExecutor turns page bytes into plain dicts (CPU bound,
+          html5lib/lxml + pandas), so parsing scales with the available cores.
+          Its workers are spawned, not forked from a process already running
+          the fetch threads.
+  write:  the calling thread commits the dicts through Syncer, the only stage
+          touching the Database. It does not fetch or parse.
+
+A full queue blocks the stage feeding it, so a slow writer throttles parsing
+and fetching instead of buffering whole seasons in memory.
+
+  python pipeline.py --min_season 60 --max_season 66
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+import database
+import sharks_ice_lib as sil
+import util
+
+TEAMS = 'teams'
+GAMES = 'games'
+# Scoresheet of the first game of a season without a stored start date.
+SCORESHEET = 'scoresheet'
+
+FETCH_WORKERS = 4
+QUEUE_SIZE = 16
+
+_DONE = object()
+
+
+def fetch_page(
+    kind: str,
+    season_id: int,
+    league: int,
+    renderer: sil.PageRenderer,
+    game_id: str | None = None,
+) -> bytes:
+  if kind == TEAMS:
+    return util.fetch(
+        sil.MAIN_STATS_URL, params=dict(league=league, season=season_id))
+  if kind == SCORESHEET:
+    return util.fetch(sil.GAME_URL, params=dict(game_id=game_id))
+  return sil.fetch_season_schedule(season_id, renderer, league=league)
+
+
+def parse_page(
+    kind: str,
+    season_id: int,
+    content: bytes,
+    parser: str | None,
+    context: Any = None,
+):
+  """Parses page bytes into plain dicts. Runs in a worker process.
+
+  Args:
+    kind: TEAMS, GAMES or SCORESHEET.
+    season_id: Season of the page.
+    content: Page bytes.
+    parser: BeautifulSoup parser, defaults to util.PARSER.
+    context: The stored start date of the season for GAMES, the games of the
+      season for SCORESHEET.
+
+  Returns:
+    Divisions for TEAMS. Otherwise a tuple of the season's games and its
+    start date, which games are dated with. For GAMES of a season without a
+    start date, it is None and the games are not dated.
+  """
+  if kind == TEAMS:
+    return sil.parse_divisions_page(content, season_id, parser=parser)
+  if kind == SCORESHEET:
+    games = context
+    soup = util.parse_html(
+        content, parser=parser, parse_only=sil.GAME_DATE_STRAINER)
+    season_start = sil.parse_game_dt(soup).date()
+  else:
+    games = sil.parse_season_schedule(content)
+    season_start = context
+  if season_start is not None:
+    sil.set_start_times(games, season_start)
+  return games, season_start
+
+
+class Pipeline:
+  """Backfills seasons through fetch, parse and write stages."""
+
+  def __init__(
+      self,
+      syncer: sil.Syncer,
+      fetch_workers: int = FETCH_WORKERS,
+      parse_workers: int | None = None,
+      queue_size: int = QUEUE_SIZE,
+      parser: str | None = None,
+  ):
+    self._syncer = syncer
+    self._fetch_workers = fetch_workers
+    self._parse_workers = parse_workers or os.cpu_count() or 1
+    self._queue_size = queue_size
+    self._parser = parser
+
+  def _fetch_stage(self, tasks: queue.Queue, raw: queue.Queue):
+    renderer = sil.PageRenderer()
+    try:
+      # Runs until the parse stage queues _DONE, since it queues scoresheets.
+      while (task := tasks.get()) is not _DONE:
+        kind, season_id, game_id = task
+        try:
+          content = fetch_page(
+              kind, season_id, self._syncer.league, renderer, game_id)
+        except Exception as e:  # pylint: disable=broad-except
+          content = e
+        raw.put((kind, season_id, content))
+    finally:
+      renderer.close()
+      raw.put(_DONE)
+
+  def _submit(
+      self,
+      executor: concurrent.futures.Executor,
+      kind: str,
+      season_id: int,
+      content: bytes | Exception,
+      context: Any,
+  ) -> concurrent.futures.Future:
+    """Submits a page for parsing, failures are set on the future."""
+    if not isinstance(content, Exception):
+      try:
+        return executor.submit(
+            parse_page, kind, season_id, content, self._parser, context)
+      except Exception as e:  # pylint: disable=broad-except
+        # E.g. BrokenProcessPool after a worker died.
+        content = e
+    future = concurrent.futures.Future()
+    future.set_exception(content)
+    return future
+
+  def _parse_stage(
+      self,
+      tasks: queue.Queue,
+      raw: queue.Queue,
+      parsed: queue.Queue,
+      executor: concurrent.futures.Executor,
+      season_starts: dict[int, Any],
+      pending: int,
+  ):
+    """Parses fetched pages and queues the scoresheets seasons need.
+
+    Args:
+      tasks: Fetch tasks.
+      raw: Fetched pages.
+      parsed: Parse results for the writer.
+      executor: Pool to parse in.
+      season_starts: Stored start dates of seasons. Schedules of the others
+        wait for the scoresheet of their first game.
+      pending: Number of tasks queued before the stage started.
+    """
+    # Bounds the pages being parsed so the raw queue keeps backpressure.
+    in_flight = collections.deque()
+    max_in_flight = self._parse_workers * 2
+    schedules = {}
+    fetchers_done = 0
+    try:
+      while pending or in_flight:
+        if pending and len(in_flight) < max_in_flight:
+          item = raw.get()
+          if item is _DONE:
+            fetchers_done += 1
+            if fetchers_done == self._fetch_workers:
+              break
+            continue
+          pending -= 1
+          kind, season_id, content = item
+          context = (schedules.pop(season_id, None) if kind == SCORESHEET
+                     else season_starts.get(season_id))
+          in_flight.append((kind, season_id, self._submit(
+              executor, kind, season_id, content, context)))
+          continue
+        kind, season_id, result = self._result(*in_flight.popleft())
+        if kind == GAMES and not isinstance(result, Exception):
+          games, season_start = result
+          if games and season_start is None:
+            schedules[season_id] = games
+            tasks.put((SCORESHEET, season_id, games[0]['game_id']))
+            pending += 1
+            continue
+        parsed.put((GAMES if kind == SCORESHEET else kind, season_id, result))
+    finally:
+      # Stop the fetchers and unblock them and the writer, even if this stage
+      # failed.
+      for _ in range(self._fetch_workers):
+        tasks.put(_DONE)
+      while fetchers_done < self._fetch_workers:
+        if raw.get() is _DONE:
+          fetchers_done += 1
+      parsed.put(_DONE)
+
+  def _result(self, kind: str, season_id: int, future):
+    try:
+      return kind, season_id, future.result()
+    except Exception as e:  # pylint: disable=broad-except
+      return kind, season_id, e
+
+  def _write_games(self, season_id: int, schedule: tuple[list[dict], Any]):
+    games, season_start = schedule
+    self._syncer.write_season_dates(season_id, season_start, games)
+    num_games = self._syncer.write_season_games(season_id, games)
+    print('Scraped %d games in season %d' % (num_games, season_id))
+    return num_games
+
+  def run(self, season_ids: list[int]):
+    """Syncs the given seasons.
+
+    Returns:
+      Dict of season id to the number of games written, None for seasons
+      whose teams or games could not be synced.
+    """
+    tasks = queue.Queue()
+    for season_id in season_ids:
+      tasks.put((TEAMS, season_id, None))
+      tasks.put((GAMES, season_id, None))
+    season_starts = {}
+    for season_id in season_ids:
+      season_start = self._syncer.get_stored_season_start(season_id)
+      if season_start is not None:
+        season_starts[season_id] = season_start
+    raw = queue.Queue(maxsize=self._queue_size)
+    parsed = queue.Queue(maxsize=self._queue_size)
+
+    results = {season_id: None for season_id in season_ids}
+    # Games are written after their season's teams, which they reference.
+    teams_synced = {}
+    waiting_games = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=self._parse_workers,
+        mp_context=multiprocessing.get_context('spawn')) as executor:
+      threads = [
+          threading.Thread(target=self._fetch_stage, args=(tasks, raw))
+          for _ in range(self._fetch_workers)
+      ]
+      threads.append(threading.Thread(
+          target=self._parse_stage,
+          args=(tasks, raw, parsed, executor, season_starts,
+                len(season_ids) * 2)))
+      for thread in threads:
+        thread.start()
+
+      while (item := parsed.get()) is not _DONE:
+        kind, season_id, result = item
+        try:
+          if isinstance(result, Exception):
+            raise result
+          if kind == TEAMS:
+            teams_synced[season_id] = False
+            self._syncer.write_season_teams(season_id, result)
+            teams_synced[season_id] = True
+            if season_id in waiting_games:
+              results[season_id] = self._write_games(
+                  season_id, waiting_games.pop(season_id))
+          elif season_id not in teams_synced:
+            waiting_games[season_id] = result
+          elif teams_synced[season_id]:
+            results[season_id] = self._write_games(season_id, result)
+        except Exception as e:  # pylint: disable=broad-except
+          print('Failed to sync %s of season %s: %s' % (kind, season_id, e))
+
+      for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--min_season', type=int, default=60)
+  parser.add_argument('--max_season', type=int, required=True)
+  parser.add_argument('--fetch_workers', type=int, default=FETCH_WORKERS)
+  parser.add_argument('--parse_workers', type=int, default=None)
+  parser.add_argument('--league', type=int, default=database.DEFAULT_LEAGUE)
+  parser.add_argument('--db', default=database.DATABASE_PATH,
+                      help='Database path of the default league.')
+  args = parser.parse_args()
+
+  db = database.Database(database.shard_path(args.league, args.db))
+  db.create_tables()
+  pipeline = Pipeline(
+      sil.Syncer(db, league=args.league),
+      fetch_workers=args.fetch_workers,
+      parse_workers=args.parse_workers)
+  start = time.perf_counter()
+  archived = db.get_archived_seasons()
+  results = pipeline.run([
+      season_id for season_id in range(args.min_season, args.max_season + 1)
+      if season_id not in archived])
+  db.optimize_search()
+  print('Synced %d games in %.1f s' % (
+      sum(r for r in results.values() if r), time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+  main()
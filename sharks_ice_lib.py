@@ -1,17 +1,23 @@
 """Scraper for SIAHL."""
 
 from typing import Any
+import concurrent.futures
+import contextlib
 import time
 import io
+import re
 import datetime
+from urllib.parse import urlencode
 import pandas as pd
 from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+import changefeed
 import database
 import util
 
@@ -20,6 +26,7 @@ TEAM_URL = TIMETOSCORE_URL + 'display-schedule'
 GAME_URL = TIMETOSCORE_URL + 'oss-scoresheet'
 DIVISION_URL = TIMETOSCORE_URL + 'display-league-stats'
 MAIN_STATS_URL = TIMETOSCORE_URL + 'display-stats.php'
+SCHEDULE_URL = TIMETOSCORE_URL + 'display-schedule.php'
 CALENDAR = 'webcal://stats.sharksice.timetoscore.com/team-cal.php?team={team}&tlev=0&tseq=0&season={season}&format=iCal'
 
 team_columns_rename = {
@@ -41,6 +48,10 @@ class MissingStatsError(Error):
   pass
 
 
+class MissingSeasonError(Error):
+  """The league has no divisions in a season, e.g. one after the current."""
+
+
 def rename(initial: dict[str, str], mapping: dict[str, str]):
   """Renames columns in a dict."""
   new_map = {}
@@ -89,9 +100,30 @@ def _parse_division_teams(table_str: str):
   return teams
 
 
-def scrape_season_divisions(season_id: int):
+# Only the first (standings) table of the stats page is used.
+DIVISIONS_STRAINER = SoupStrainer('table')
+
+
+def scrape_season_divisions(
+    season_id: int,
+    parser: str | None = None,
+    league: int = database.DEFAULT_LEAGUE,
+):
   """Scrape divisions and teams in a season."""
-  soup = util.get_html(MAIN_STATS_URL, params=dict(league=1, season=season_id))
+  content = util.fetch(
+      MAIN_STATS_URL, params=dict(league=league, season=season_id))
+  return parse_divisions_page(content, season_id, parser=parser)
+
+
+def parse_divisions_page(
+    content: bytes, season_id: int, parser: str | None = None):
+  """Parse divisions and teams from raw stats page bytes."""
+  soup = util.parse_html(content, parser=parser, parse_only=DIVISIONS_STRAINER)
+  return parse_season_divisions(soup, season_id)
+
+
+def parse_season_divisions(soup: BeautifulSoup, season_id: int):
+  """Parse divisions and teams from a parsed stats page."""
   divisions = []
   level = ''
   division_id = 0
@@ -132,154 +164,323 @@ def scrape_season_divisions(season_id: int):
     })
   return divisions
 
-class DumbDateTime:
-  MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-  def __init__(self, month, day, hour, minute):
-    self._month = month
-    self._day = day
-    self._hour = hour
-    self._minute = minute
-
-  @staticmethod
-  def from_string(s: str):
-    md, hm = s.split()
-    m, d = md.split('/')
-    h, mi = hm.split(':')
-    return DumbDateTime(m, d, h, mi)
-
-  @staticmethod
-  def from_date_time(date: str, timeofday: str):
-    timeofday = timeofday.replace('12 Noon', '12:00 PM')
-    try:
-      _, month, day = date.split()
-      hour_minute, m = timeofday.split()
-      hour, minute = hour_minute.split(':')
-      hour = int(hour)
-      if m == 'PM' and hour < 12:
-        hour += 12
-    except ValueError as e:
-      raise Exception("Failed to parse %s %s to datetime" % (date, timeofday))
-    return DumbDateTime(
-      month=(DumbDateTime.MONTHS.index(month) + 1),
-      day=int(day), 
-      hour=hour,
-      minute=int(minute))
-
-  def __str__(self):
-    return '%d/%d %d:%02d' % (self._month, self._day, self._hour, self._minute)
-  
-  def as_date(self, year: int):
-    return datetime.datetime(year=year, month=self._month, day=self._day, hour=self._hour, minute=self._minute)
-
-def ordinal(n):
-  """Converts an integer to its ordinal string (e.g., 1st, 2nd, 3rd)."""
-
-  if 11 <= (n % 100) <= 13:
-    return f"{n}th"
-  else:
-    suffix = {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
-    return f"{n}{suffix}"
-
-def get_game_dt(game_id: int):
-  soup = util.get_html(GAME_URL, params=dict(game_id=game_id))
-  start_path =(
-    'body > table:nth-child(1) > tbody:nth-child(1) > tr:nth-child(1) >'
-    ' td:nth-child(1) > table:nth-child(1) > tbody:nth-child(1) >'
-    ' tr:nth-child(1) > td:nth-child(1)')
-  start_ele = soup.select_one(start_path)
-  val = start_ele.text.strip().replace('Date:', '')
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Scoresheet "Date:" cell. The <tbody> is matched with a descendant combinator
+# since only html5lib inserts it implicitly.
+GAME_DATE_SELECTOR = (
+    'body > table:nth-child(1) tr:nth-child(1) > td:nth-child(1) >'
+    ' table:nth-child(1) tr:nth-child(1) > td:nth-child(1)')
+# Text of that cell. get_game_dt only keeps it instead of the whole scoresheet.
+GAME_DATE_TEXT = re.compile(r'Date:')
+GAME_DATE_STRAINER = SoupStrainer(string=GAME_DATE_TEXT)
+
+def get_game_dt(game_id: int, parser: str | None = None):
+  soup = util.get_html(GAME_URL, params=dict(game_id=game_id), parser=parser,
+                       parse_only=GAME_DATE_STRAINER)
+  return parse_game_dt(soup)
+
+def parse_game_dt(soup: BeautifulSoup):
+  """Parses the date of a full or GAME_DATE_STRAINER scoresheet tree."""
+  start_ele = soup.select_one(GAME_DATE_SELECTOR)
+  if start_ele is None:
+    # Partial trees only hold the cell's text.
+    start_ele = soup.find(string=GAME_DATE_TEXT)
+  val = start_ele.text.replace('Date:', '').strip()
   dt = datetime.datetime.strptime(val, '%m-%d-%y')
   return dt
 
-def guess_year(start_time: DumbDateTime, first_game_dt: datetime.datetime) -> datetime.datetime:
-  try:
-    same_year = start_time.as_date(first_game_dt.year)
-  except:
-    # Usually means leap year
-    return start_time.as_date(first_game_dt.year + 1)
-  if (same_year < first_game_dt):
-    return start_time.as_date(first_game_dt.year + 1)
-  return same_year
+SCHEDULE_TIME_PATTERN = r'^(\d{1,2}):(\d{2}) ([AP]M)$'
+
+def parse_start_times(
+    dates: pd.Series,
+    times: pd.Series,
+    season_start: datetime.date,
+) -> pd.Series:
+  """Converts schedule date and time columns to datetimes in one pass.
+
+  Dates such as 'Fri Mar 1' before the month and day of season_start are in
+  the next year, which also places Feb 29 in the leap year of a season
+  spanning it. '12 Noon' is noon and 12 AM midnight.
+
+  Args:
+    dates: Schedule dates, e.g. 'Fri Mar 1'.
+    times: Schedule times, e.g. '7:15 PM' or '12 Noon'.
+    season_start: Date of the first game of the season.
+  """
+  month_day = dates.str.split(expand=True).reindex(columns=[1, 2])
+  month = month_day[1].map(
+      {m: i + 1 for i, m in enumerate(MONTHS)})
+  day = pd.to_numeric(month_day[2], errors='coerce')
+  clock = times.str.replace('12 Noon', '12:00 PM').str.strip().str.extract(
+      SCHEDULE_TIME_PATTERN)
+  hour = pd.to_numeric(clock[0], errors='coerce')
+  minute = pd.to_numeric(clock[1], errors='coerce')
+  invalid = month.isna() | day.isna() | hour.isna() | minute.isna()
+  if invalid.any():
+    i = invalid.idxmax()
+    raise Exception("Failed to parse %s %s to datetime" % (dates[i], times[i]))
+
+  hour = hour % 12 + (clock[2] == 'PM') * 12
+  before_start = (month < season_start.month) | (
+      (month == season_start.month) & (day < season_start.day))
+  year = season_start.year + before_start.astype(int)
+  return pd.to_datetime(pd.DataFrame(
+      {'year': year, 'month': month, 'day': day, 'hour': hour,
+       'minute': minute}))
+
+
+def set_start_times(
+    games: list[dict[str, Any]], season_start: datetime.date | None):
+  """Replaces the date and time of schedule games with a start_dt."""
+  if not games:
+    return
+  start_dts = parse_start_times(
+      pd.Series([game.pop('date') for game in games]),
+      pd.Series([game.pop('time') for game in games]),
+      season_start)
+  for game, start_dt in zip(games, start_dts.dt.to_pydatetime()):
+    game['start_dt'] = start_dt
+
+class PageRenderer:
+  """Loads pages that need JavaScript in a lazily started headless Chrome."""
+
+  def __init__(self):
+    self._driver = None
+
+  def render(self, url: str, params: dict[str, str]) -> bytes:
+    """Returns the rendered page, or b'' if it has no table."""
+    if self._driver is None:
+      options = webdriver.ChromeOptions()
+      options.add_argument('--headless')
+      self._driver = webdriver.Chrome(options=options)
+    self._driver.get(url + '?' + urlencode(params))
+    # Wait for the page to load (adjust the timeout as needed)
+    wait = WebDriverWait(self._driver, 5)
+    try:
+      wait.until(EC.presence_of_element_located((By.TAG_NAME, 'tbody')))
+    except:
+      return b''
+    return self._driver.page_source.encode()
+
+  def close(self):
+    if self._driver is not None:
+      self._driver.close()
+      self._driver = None
+
+
+def fetch_season_schedule(
+    season_id: int,
+    renderer: PageRenderer,
+    league: int = database.DEFAULT_LEAGUE,
+) -> bytes:
+  """Fetches the rendered schedule page of a season."""
+  params = dict(stat_class=1, league=league, season=season_id)
+  return util.recorded(
+      SCHEDULE_URL, params, lambda: renderer.render(SCHEDULE_URL, params))
+
+
+SCHEDULE_COLUMNS = {
+  'Game': 'game_id',
+  'Date': 'date',
+  'Time': 'time',
+  'Rink': 'rink',
+  'League': 'league',
+  'Level': 'level',
+  'Away': 'away',
+  # 'away_goals', 
+  'Home': 'home', 
+  # 'home_goals', 
+  'Type': 'type', 
+}
+
+
+def parse_season_schedule(html_content: bytes) -> list[dict[str, Any]]:
+  """Parse games from a schedule page, keeping their date and time strings."""
+  if not html_content:
+    return []
+
+  # Get the HTML content of the table
+  soup = BeautifulSoup(html_content, 'html.parser')
+  table = soup.find('table')
+
+  rows = table.find_all('tr')
+  # Parse headers
+  columns = []
+  for h in rows[1].find_all('th'):
+    text = h.text.strip()
+    if text == 'Goals':
+      text = 'away_goals' if 'away_goals' not in columns else 'home_goals'
+    text = SCHEDULE_COLUMNS.get(text, text)
+    columns.append(text)
+
+  games = []
+  for row in rows[2:]:
+    cells = row.find_all('td')
+    row_data = [cell.text.strip() for cell in cells]
+    row_data = [a.replace('  ', ' ') for a in row_data]
+    if len(cells) != len(columns):
+      print('Row has %s, Columns is %s' % (len(cells), len(columns)))
+      continue
+    game = dict(zip(columns, row_data))
+    if game['type'] == 'Practice':
+      continue
+    if not game['away'] and not game['home']:
+      continue
+    game['rink'] = game['rink'].replace('San Jose ', '')
+    game['level'] = game['level'].replace('Adult Division', 'Div')
+    games.append(game)
+  return games
+
+
+class SyncMetrics:
+  """Metrics of syncing one kind of data ('teams' or 'games') of a season."""
+
+  def __init__(self):
+    self.started_at = time.time()
+    self.fetch_seconds = 0.0
+    self.parse_seconds = 0.0
+    self.write_seconds = 0.0
+    self.pages = 0
+    self.bytes = 0
+    self.rows = 0
+    self.error = None
+
+  @contextlib.contextmanager
+  def fetch(self):
+    """Times fetching, including parsing the fetched pages."""
+    start = time.perf_counter()
+    with util.track_fetches() as fetches:
+      try:
+        yield
+      finally:
+        self.pages += fetches.pages
+        self.bytes += fetches.bytes
+        self.fetch_seconds += time.perf_counter() - start
+
+  @contextlib.contextmanager
+  def scrape(self):
+    """Times fetching and parsing, i.e. everything that is not a fetch."""
+    start = time.perf_counter()
+    with util.track_fetches() as fetches:
+      try:
+        yield
+      finally:
+        self.pages += fetches.pages
+        self.bytes += fetches.bytes
+        self.fetch_seconds += fetches.seconds
+        self.parse_seconds += time.perf_counter() - start - fetches.seconds
+
+  @contextlib.contextmanager
+  def write(self):
+    """Times writing, the context adds the rows it writes to rows."""
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.write_seconds += time.perf_counter() - start
+
+  def as_dict(self):
+    return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+
 
 # Class for syncing data from scrapers and adding to DB
 class Syncer:
-  def __init__(self, db: database.Database):
+  def __init__(
+      self, db: database.Database, league: int = database.DEFAULT_LEAGUE):
     self._db = db
+    self._league = league
     self._min_season = 0
-
-  def get_season_games(self, driver, season_id: int):
-    url = 'https://stats.sharksice.timetoscore.com/display-schedule.php?stat_class=1&league=1&season=%s' % season_id
-    driver.get(url)
-    # Wait for the page to load (adjust the timeout as needed)
-    wait = WebDriverWait(driver, 5)
+    self._renderer = PageRenderer()
+    # Id of the sync run being recorded to SyncRuns, see sync().
+    self._run_id = None
+
+  @property
+  def league(self) -> int:
+    return self._league
+
+  def fetch_season_schedule(self, season_id: int) -> bytes:
+    """Fetches the rendered schedule page of a season."""
+    return fetch_season_schedule(season_id, self._renderer, league=self._league)
+
+  def get_season_start(
+      self, season_id: int, games: list[dict[str, Any]]
+  ) -> datetime.date | None:
+    """Start date of a season, None if it has no games.
+
+    It is stored in Seasons by write_season_dates once known, so only the
+    first sync of a season fetches the scoresheet of its first game for it.
+    """
+    if not games:
+      return None
+    season_start = self.get_stored_season_start(season_id)
+    if season_start is None:
+      return get_game_dt(games[0]['game_id']).date()
+    return season_start
+
+  def get_stored_season_start(self, season_id: int) -> datetime.date | None:
+    """Start date of a season stored by write_season_dates, if any."""
+    season_dates = self._db.get_season_dates(season_id)
+    return None if season_dates is None else season_dates[0]
+
+  def write_season_dates(
+      self,
+      season_id: int,
+      season_start: datetime.date | None,
+      games: list[dict[str, Any]],
+  ):
+    """Stores the start date of a season and the date of its last game."""
+    if games:
+      self._db.set_season_dates(
+          season_id, season_start,
+          max(game['start_dt'] for game in games).date())
+
+  @contextlib.contextmanager
+  def _metrics(self, season_id: int, kind: str):
+    """Records SyncMetrics of the context if a sync run is in progress."""
+    metrics = SyncMetrics()
+    record = True
     try:
-      wait.until(EC.presence_of_element_located((By.TAG_NAME, 'tbody')))
-    except:
-      return []
-
-    # Get the HTML content of the table
-    html_content = driver.page_source
-    soup = BeautifulSoup(html_content, 'html.parser')
-    table = soup.find('table')
-
-    # Extract data from the table (adjust the selectors as needed)
-    column_rename = {
-      'Game': 'game_id',
-      'Date': 'date',
-      'Time': 'time',
-      'Rink': 'rink',
-      'League': 'league',
-      'Level': 'level',
-      'Away': 'away',
-      # 'away_goals', 
-      'Home': 'home', 
-      # 'home_goals', 
-      'Type': 'type', 
-    }
-    rows = table.find_all('tr')
-    # Parse headers
-    columns = []
-    for h in rows[1].find_all('th'):
-      text = h.text.strip()
-      if text == 'Goals':
-        text = 'away_goals' if 'away_goals' not in columns else 'home_goals'
-      text = column_rename.get(text, text)
-      columns.append(text)
-    
-    first_game_dt = None
-    for row in rows[2:]:
-      cells = row.find_all('td')
-      row_data = [cell.text.strip() for cell in cells]
-      row_data = [a.replace('  ', ' ') for a in row_data]
-      if len(cells) != len(columns):
-        print('Row has %s, Columns is %s' % (len(cells), len(columns)))
-        continue
-      game = dict(zip(columns, row_data))
-      if game['type'] == 'Practice':
-        continue
-      if not game['away'] and not game['home']:
-        continue
-      game['rink'] = game['rink'].replace('San Jose ', '')
-      game['level'] = game['level'].replace('Adult Division', 'Div')
-      # Use first game time to estimate year for all games.
-      if first_game_dt is None:
-        first_game_dt = get_game_dt(game['game_id'])
-      start_time = DumbDateTime.from_date_time(game.pop('date'), game.pop('time'))
-      game['start_dt'] = guess_year(start_time, first_game_dt)
-      yield game
+      yield metrics
+    except MissingSeasonError:
+      # Seasons after the current one, which sync() probes for.
+      record = False
+      raise
+    except Exception as e:
+      metrics.error = '%s: %s' % (type(e).__name__, e)
+      raise
+    finally:
+      if self._run_id is not None and record:
+        self._db.add_sync_metrics(
+            self._run_id, season_id, kind, **metrics.as_dict())
 
   def sync_season_teams(self, season_id: int):
     """Sync divisions from site."""
     print('Scraping divisions from season %s' % season_id)
-    divs = scrape_season_divisions(season_id=season_id)
+    with self._metrics(season_id, 'teams') as metrics:
+      with metrics.scrape():
+        divs = scrape_season_divisions(
+            season_id=season_id, league=self._league)
+      with metrics.write():
+        metrics.rows += self.write_season_teams(season_id, divs)
+
+  def write_season_teams(self, season_id: int, divs: list[dict[str, Any]]):
+    """Writes scraped divisions, teams and standings.
+
+    Returns:
+      The number of division, team and standings rows written.
+    """
     if len(divs) == 0:
-      raise Exception("No divs found for season %s" % season_id)
+      raise MissingSeasonError("No divs found for season %s" % season_id)
+    self._db.ensure_season(season_id)
+    num_rows = 0
     for div in divs:
       self._db.add_division(
           division_id=div['id'],
           conference_id=div['conference_id'],
           name=div['name'],
       )
+      num_rows += 1 + 2 * len(div['teams'])
       for i, team in enumerate(div['teams']):
         team_id = team.pop('id')
         team_name = team.pop('name')
@@ -287,7 +488,7 @@ class Syncer:
             team_id=team_id,
             name=team_name,
         )
-        team['place'] = ordinal(i + 1)
+        team['place'] = util.ordinal(i + 1)
         self._db.set_team_stats(
             season_id=season_id,
             division_id=div['id'],
@@ -295,45 +496,58 @@ class Syncer:
             team_id=team_id,
             stats=team,
         )
+    return num_rows
 
   def sync_season_games(self, season_id: int):
     print('Scraping games from season %s' % season_id)
+    with self._metrics(season_id, 'games') as metrics:
+      try:
+        with metrics.scrape():
+          games = parse_season_schedule(self.fetch_season_schedule(season_id))
+      finally:
+        self._renderer.close()
+      with metrics.fetch():
+        season_start = self.get_season_start(season_id, games)
+      with metrics.scrape():
+        set_start_times(games, season_start)
+      with metrics.write():
+        self.write_season_dates(season_id, season_start, games)
+        num_games = self.write_season_games(season_id, games)
+        metrics.rows += num_games
+      return num_games
+
+  def write_season_games(self, season_id: int, games: list[dict[str, Any]]):
+    """Writes dated schedule games, returns the number written."""
     num_games = 0
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    driver = webdriver.Chrome(options=options)
-    try:
-      for game in self.get_season_games(driver, season_id):
-        # Goals can be str, int, or float for some reason.
-        # Correct all to string to allow for shootouts (e.g. "4 S")
-        if isinstance(game['home_goals'], float):
-          game['home_goals'] = str(int(game['home_goals']))
-        elif game['home_goals'] is None:
-          del game['home_goals']
-        if isinstance(game['away_goals'], float):
-          game['away_goals'] = str(int(game['away_goals']))
-        elif game['away_goals'] is None:
-          del game['away_goals']
-        
-        game['game_id'] = game['game_id'].replace('*', '').replace('^', '')
+    for game in games:
+      # Goals can be str, int, or float for some reason.
+      # Correct all to string to allow for shootouts (e.g. "4 S")
+      if isinstance(game['home_goals'], float):
+        game['home_goals'] = str(int(game['home_goals']))
+      elif game['home_goals'] is None:
+        del game['home_goals']
+      if isinstance(game['away_goals'], float):
+        game['away_goals'] = str(int(game['away_goals']))
+      elif game['away_goals'] is None:
+        del game['away_goals']
+      
+      game['game_id'] = game['game_id'].replace('*', '').replace('^', '')
 
-        try:
-          game['home_id'] = self._db.get_team_id(game['home'], season_id=season_id)
-        except Exception as e:
-          print("Failed to get teams for game %s: %s" % (game['game_id'], e))
-          game['home_id'] = -1
+      try:
+        game['home_id'] = self._db.get_team_id(game['home'], season_id=season_id)
+      except Exception as e:
+        print("Failed to get teams for game %s: %s" % (game['game_id'], e))
+        game['home_id'] = -1
 
-        try:
-          game['away_id'] = self._db.get_team_id(game['away'], season_id=season_id)
-        except Exception as e:
-          print("Failed to get teams for game %s: %s" % (game['game_id'], e))
-          game['away_id'] = -1
-        self._db.add_game(
-          season_id=season_id,
-          **game)
-        num_games += 1
-    finally:
-      driver.close()
+      try:
+        game['away_id'] = self._db.get_team_id(game['away'], season_id=season_id)
+      except Exception as e:
+        print("Failed to get teams for game %s: %s" % (game['game_id'], e))
+        game['away_id'] = -1
+      self._db.add_game(
+        season_id=season_id,
+        **game)
+      num_games += 1
     return num_games
 
   def set_min_season(self, min_season):
@@ -342,28 +556,64 @@ class Syncer:
   def sync(self, lookback=datetime.timedelta(days=1)):
     season_id = self._min_season
     season_errors = 0
-    while True:
-      if season_errors >= 4:
-        break
-      try:
-        self.sync_season_teams(season_id=season_id)
-      except Exception:
-        season_errors += 1
+    self._run_id = self._db.start_sync_run()
+    archived = self._db.get_archived_seasons()
+    try:
+      while True:
+        if season_errors >= 4:
+          self._db.prune_changes(changefeed.MAX_CHANGE_AGE)
+          self._db.optimize_search()
+          break
+        if season_id in archived:
+          # Completed and moved out of the live database, see archive.py.
+          season_id += 1
+          continue
+        try:
+          self.sync_season_teams(season_id=season_id)
+        except Exception as e:
+          # Also how the seasons after the current one are detected.
+          print('Failed to sync teams of season %s: %s' % (season_id, e))
+          season_errors += 1
+          season_id += 1
+          continue
+        games = self.sync_season_games(season_id=season_id)
+        print('Scraped %d games in season %d' % (games, season_id))
+        # TODO: Move min_season if current season is invalid or too far back.
+        season_errors = 0
         season_id += 1
-        continue
-      games = self.sync_season_games(season_id=season_id, lookback=lookback)
-      print('Scraped %d games in season %d' % (games, season_id))
-      # TODO: Move min_season if current season is invalid or too far back.
-      season_errors = 0
-      season_id += 1
-
-
-def scrape():
-  DATABASE.create_tables()
-  syncer = Syncer(DATABASE)
-  syncer.set_min_season(60)
+    finally:
+      self._run_id = None
+
+
+def sync_leagues(
+    leagues: list[int],
+    min_season: int,
+    path: str = database.DATABASE_PATH,
+):
+  """Syncs leagues concurrently, each into its own database shard."""
+
+  def sync_league(league):
+    db = database.Database(database.shard_path(league, path))
+    try:
+      db.create_tables()
+      syncer = Syncer(db, league=league)
+      syncer.set_min_season(min_season)
+      syncer.sync()
+    finally:
+      db.close()
+
+  with concurrent.futures.ThreadPoolExecutor(len(leagues)) as executor:
+    futures = {executor.submit(sync_league, league): league for league in leagues}
+    for future in concurrent.futures.as_completed(futures):
+      try:
+        future.result()
+      except Exception as e:
+        print('Failed to sync league %s: %s' % (futures[future], e))
+
+
+def scrape(leagues: list[int] = (database.DEFAULT_LEAGUE,)):
   while True:
-    syncer.sync()
+    sync_leagues(leagues, min_season=60)
     time.sleep(10)
 
 
@@ -1,8 +1,12 @@
 """Helper functions for sharks scraper."""
 
+import contextlib
 import datetime
+import hashlib
 import json
 import os
+import threading
+import time
 from urllib import parse
 import bs4
 import requests
@@ -17,6 +21,120 @@ HEADERS = {
 
 CACHE = False
 
+# Parser backend used by get_html. 'lxml' is a C parser and is several times
+# faster than 'html5lib'; 'html5lib' is still available for pages that rely on
+# its browser-like tree fixups (e.g. implicit <tbody> insertion).
+PARSER = 'lxml'
+PARSERS = ('lxml', 'html.parser', 'html5lib')
+
+# Record/replay of upstream pages. In 'record' mode every fetched page is
+# archived under RECORDING_DIR, in 'replay' mode pages are served from there
+# and nothing touches the network. See set_recording().
+RECORDING_MODES = ('record', 'replay')
+RECORDING_MODE = None
+RECORDING_DIR = '/tmp/__recordings__'
+
+
+class MissingRecordingError(Exception):
+  pass
+
+
+def set_recording(mode: str | None, directory: str | None = None):
+  """Sets the record/replay mode, or disables it when mode is None."""
+  global RECORDING_MODE, RECORDING_DIR
+  if mode is not None and mode not in RECORDING_MODES:
+    raise ValueError('Unknown recording mode %s' % mode)
+  RECORDING_MODE = mode
+  if directory is not None:
+    RECORDING_DIR = directory
+
+
+def _recording_path(url: str, params: dict[str, str] | None):
+  key = url + '?' + parse.urlencode(sorted((params or {}).items()))
+  digest = hashlib.sha1(key.encode()).hexdigest()
+  return os.path.join(RECORDING_DIR, digest + '.html')
+
+
+class FetchStats:
+  """Pages, bytes and seconds spent fetching, see track_fetches()."""
+
+  def __init__(self):
+    self.pages = 0
+    self.bytes = 0
+    self.seconds = 0.0
+
+
+_fetch_trackers = threading.local()
+
+
+@contextlib.contextmanager
+def track_fetches():
+  """Counts the pages fetched by the current thread within the context."""
+  stats = FetchStats()
+  trackers = getattr(_fetch_trackers, 'stack', None)
+  if trackers is None:
+    trackers = _fetch_trackers.stack = []
+  trackers.append(stats)
+  try:
+    yield stats
+  finally:
+    trackers.remove(stats)
+
+
+def recorded(url: str, params: dict[str, str] | None, fetch_fn) -> bytes:
+  """Returns the page for url/params, recording or replaying it if enabled.
+
+  Args:
+    url: Page url, used with params as the recording key.
+    params: Query params of the page.
+    fetch_fn: Called with no arguments to fetch the page bytes live.
+  """
+  start = time.perf_counter()
+  content = _recorded(url, params, fetch_fn)
+  for stats in getattr(_fetch_trackers, 'stack', ()):
+    stats.pages += 1
+    stats.bytes += len(content)
+    stats.seconds += time.perf_counter() - start
+  return content
+
+
+def _recorded(url: str, params: dict[str, str] | None, fetch_fn) -> bytes:
+  path = _recording_path(url, params)
+  if RECORDING_MODE == 'replay':
+    if not os.path.exists(path):
+      raise MissingRecordingError('No recording of %s (%s)' % (url, params))
+    with open(path, 'rb') as f:
+      return f.read()
+  content = fetch_fn()
+  if RECORDING_MODE == 'record':
+    os.makedirs(RECORDING_DIR, exist_ok=True)
+    with open(path, 'wb') as f:
+      f.write(content)
+    # What the page is, for tools iterating over recordings.
+    with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+      json.dump({'url': url, 'params': params or {}}, f)
+  return content
+
+
+def list_recordings(directory: str | None = None):
+  """Yields (url, params, content) of the pages recorded in a directory."""
+  directory = directory or RECORDING_DIR
+  for name in sorted(os.listdir(directory)):
+    if not name.endswith('.json'):
+      continue
+    with open(os.path.join(directory, name)) as f:
+      page = json.load(f)
+    with open(os.path.join(directory, name[:-len('.json')] + '.html'), 'rb') as f:
+      yield page['url'], page['params'], f.read()
+
+
+def fetch(url: str, params: dict[str, str] | None = None) -> bytes:
+  """Fetch raw page bytes from a given URL."""
+  return recorded(
+      url,
+      params,
+      lambda: requests.get(url, params=params, headers=HEADERS).content)
+
 
 def get_value_from_link(url: str, key: str):
   query = parse.urlsplit(url).query
@@ -24,6 +142,16 @@ def get_value_from_link(url: str, key: str):
   return query_map.get(key)
 
 
+def ordinal(n):
+  """Converts an integer to its ordinal string (e.g., 1st, 2nd, 3rd)."""
+
+  if 11 <= (n % 100) <= 13:
+    return f"{n}th"
+  else:
+    suffix = {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
 def parse_game_time(date_str, time_str, year=None):
   time_str = time_str.replace('12 Noon', '12:00 PM')
   if year is None:
@@ -33,12 +161,39 @@ def parse_game_time(date_str, time_str, year=None):
   )
 
 
-def get_html(url: str, params: dict[str, str] | None = None, log=False):
+def parse_html(
+    content: bytes | str,
+    parser: str | None = None,
+    parse_only: bs4.SoupStrainer | None = None,
+):
+  """Parse HTML content with the given parser backend.
+
+  Args:
+    content: Raw page bytes (preferred, lets the parser sniff the encoding) or
+      an already decoded string.
+    parser: One of PARSERS. Defaults to PARSER.
+    parse_only: Optional SoupStrainer restricting the tree to matching
+      subtrees. Ignored by html5lib, which always builds the full tree.
+  """
+  parser = parser or PARSER
+  if parser not in PARSERS:
+    raise ValueError('Unknown parser %s, expected one of %s' % (parser, PARSERS))
+  if parser == 'html5lib':
+    parse_only = None
+  return bs4.BeautifulSoup(content, parser, parse_only=parse_only)
+
+
+def get_html(
+    url: str,
+    params: dict[str, str] | None = None,
+    log=False,
+    parser: str | None = None,
+    parse_only: bs4.SoupStrainer | None = None,
+):
   """Read HTML from a given URL."""
   if log:
     print('Reading HTML from %s (%s)...' % (url, params))
-  html = requests.get(url, params=params, headers=HEADERS)
-  return bs4.BeautifulSoup(html.text, 'html5lib')
+  return parse_html(fetch(url, params), parser=parser, parse_only=parse_only)
 
 
 def cache_json(
@@ -0,0 +1,24 @@
+"""gevent entry point of the Flask API.
+
+Monkey-patches the standard library before importing the app, so that idle
+/api/changes streams park a greenlet instead of holding a worker thread:
+
+  uwsgi --http :5000 --wsgi-file wsgi.py --callable app --gevent 2000
+
+or without uWSGI:
+
+  python wsgi.py
+"""
+
+from gevent import monkey
+monkey.patch_all()
+# pylint: disable=g-import-not-at-top,wrong-import-position
+
+from gevent import pywsgi
+
+from app import app
+
+
+if __name__ == '__main__':
+  print('Running Flask app on gevent on port 5000')
+  pywsgi.WSGIServer(('0.0.0.0', 5000), app).serve_forever()